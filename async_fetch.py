@@ -0,0 +1,229 @@
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from backends import USER_AGENT, HttpBackend, RequestAborted
+from parsing import parse_detail, parse_permits
+from metrics import metrics
+
+# Concurrent detail and permit fetching on asyncio. All dentists of a results
+# page are fetched at once, bounded by a per-host connection cap and a per-host
+# token bucket shared by every worker, with jittered exponential backoff on
+# 429 and 5xx responses. Results pages are paced by the same bucket. aiohttp
+# is only needed when this backend is used.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_CONCURRENCY = 8  # Connections per host, across all workers
+DEFAULT_RATE = 10  # Requests per second and host, across all workers; 0 for no limit
+SLOT_POLL = 0.01  # Seconds between attempts to take a connection slot
+
+
+class TokenBucket:
+    # Thread-safe so one bucket can pace the event loops of every worker.
+    # Tokens are reserved up front, callers then sleep until theirs is due
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class HostSlots:
+    # A connection cap shared by the event loops of every worker. Waiting
+    # coroutines poll the semaphore instead of blocking their loop, so they
+    # stay cancellable and never hold a slot they didn't get
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+
+    async def __aenter__(self):
+        while not self.semaphore.acquire(blocking=False):
+            await asyncio.sleep(SLOT_POLL)
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+# Shared by every worker's backend, keyed by host and setting
+_buckets = {}
+_slots = {}
+_buckets_lock = threading.Lock()
+
+def host_bucket(host, rate):
+    # None when requests aren't paced
+    if not rate:
+        return None
+    with _buckets_lock:
+        if (host, rate) not in _buckets:
+            _buckets[(host, rate)] = TokenBucket(rate)
+        return _buckets[(host, rate)]
+
+def host_slots(host, limit):
+    with _buckets_lock:
+        if (host, limit) not in _slots:
+            _slots[(host, limit)] = HostSlots(limit)
+        return _slots[(host, limit)]
+
+def backoff_delay(attempt, base_delay, max_delay, retry_after=None):
+    # Full jitter around an exponential step, or the server's Retry-After
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AsyncHttpBackend(HttpBackend):
+    name = 'async'
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, max_retries=4, base_delay=0.5, max_delay=30, cache=None, **kwargs):
+        super().__init__(cache=cache, **kwargs)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'requests': 0, 'retries': 0}
+
+        # Each worker thread drives its own loop and keeps one aiohttp session
+        # open on it so connections are reused from page to page
+        self.loop = asyncio.new_event_loop()
+        self.client = None
+        self.closing = False
+
+    def fetch(self, url, kind):
+        # Results pages go through the requests session, under the same per-host pace
+        bucket = host_bucket(urlsplit(url).netloc, self.rate)
+        if bucket is not None:
+            time.sleep(bucket.reserve())
+        return super().fetch(url, kind)
+
+    async def get_text(self, url, kind):
+        import aiohttp
+
+        cached = self.cache.get(url, kind) if self.cache is not None else None
+        if cached is not None and cached['fresh']:
+            return cached['body']
+
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        host = urlsplit(url).netloc
+        attempt = 0
+        bucket = host_bucket(host, self.rate)
+        slots = host_slots(host, self.concurrency)
+        while True:
+            if self.aborted.is_set():
+                raise RequestAborted("Request aborted")
+            if bucket is not None:
+                await bucket.acquire()
+            try:
+                async with slots:
+                    self.stats['requests'] += 1
+                    with metrics.span('page_load', kind=kind):
+                        async with self.client.get(url, headers=headers, ssl=self.verify) as response:
+                            if response.status in RETRY_STATUSES:
+                                raise RetryableStatus(response.status, response.headers.get('Retry-After'))
+                            if cached is not None and response.status == 304:
+                                self.cache.refresh(url)
+                                return cached['body']
+                            response.raise_for_status()
+                            body = await response.text()
+                        if self.cache is not None:
+                            self.cache.put(url, kind, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                        return body
+            except (RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.stats['retries'] += 1
+                metrics.incr('retries', kind=kind)
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay, getattr(e, 'retry_after', None)))
+                attempt += 1
+
+    async def fetch_page(self, url, kind, parse):
+        with metrics.span('dentist_fetch', kind=kind) as span:
+            html = await self.get_text(url, kind)
+            with metrics.span('extract', kind=kind):
+                page = parse(html, url)
+        return page, span.seconds
+
+    async def fetch_dentist_async(self, row, pipeline):
+        detail, seconds = await self.fetch_page(row['detail_url'], 'detail', parse_detail)
+        pipeline.fetched('detail', seconds)
+        permits = None
+        if pipeline.needs_permits(detail):
+            permits, seconds = await self.fetch_page(detail['permits_url'], 'permits', parse_permits)
+            pipeline.fetched('permits', seconds)
+            pipeline.check_permits(permits)
+        return detail, permits
+
+    def abort(self):
+        # Cancel every request on this worker's loop from the controller's thread
+        super().abort()
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.cancel_tasks)
+
+    def cancel_tasks(self):
+        # Queued while the loop was idle, this only runs once something drives
+        # the loop again. That may be close(), whose own task must finish
+        if self.closing:
+            return
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+
+    async def fetch_all(self, rows, pipeline):
+        import aiohttp
+
+        if self.client is None:
+            self.client = aiohttp.ClientSession(headers={'User-Agent': USER_AGENT},
+                                                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        results = await asyncio.gather(*(self.fetch_dentist_async(row, pipeline) for row in rows), return_exceptions=True)
+        return {row['detail_url']: result for row, result in zip(rows, results)}
+
+    def fetch_dentists(self, rows, pipeline):
+        # Returns {detail_url: (detail, permits)}, or the exception for dentists that failed
+        if not rows:
+            return {}
+        if self.aborted.is_set():
+            raise RequestAborted("Request aborted")
+        try:
+            return self.loop.run_until_complete(self.fetch_all(rows, pipeline))
+        except asyncio.CancelledError:
+            # Only abort() cancels, the workers expect an ordinary exception
+            raise RequestAborted("Request aborted") from None
+
+    def close(self):
+        self.closing = True
+        try:
+            if self.client is not None:
+                self.loop.run_until_complete(self.client.close())
+        finally:
+            self.loop.close()
+            super().close()
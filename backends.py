@@ -0,0 +1,128 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from parsing import parse_results, parse_detail, parse_permits
+from metrics import metrics
+
+# Fetch backends. Each backend loads a page by URL and returns the structured
+# payload from parsing.py, so the scraping loop doesn't care how pages arrive.
+# The asyncio and Selenium backends live in their own modules and are only
+# imported when they're used, so HTTP runs never load aiohttp or Selenium.
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+
+class RequestAborted(Exception):
+    pass
+
+
+class AbortableRetry(Retry):
+    # urllib3 retries that stop once their backend is aborted. urllib3 copies
+    # Retry objects with new() on every attempt, so the event is carried over
+    aborted = None
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.aborted = self.aborted
+        return retry
+
+    def sleep(self, response=None):
+        if self.aborted is not None and self.aborted.is_set():
+            raise RequestAborted("Request aborted")
+        super().sleep(response)
+
+
+class HttpBackend:
+    name = 'http'
+
+    def __init__(self, pool_size=10, timeout=15, retries=3, verify=True, cache=None):
+        self.timeout = timeout
+        self.verify = verify
+        self.cache = cache
+        self.aborted = threading.Event()
+
+        # One pooled session with keep-alive shared by every request
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        retry = AbortableRetry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        retry.aborted = self.aborted
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url, kind):
+        if self.aborted.is_set():
+            raise RequestAborted("Request aborted")
+        cached = self.cache.get(url, kind) if self.cache is not None else None
+        if cached is not None and cached['fresh']:
+            return cached['body']
+
+        # Revalidate stale pages so unchanged ones aren't downloaded again
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        with metrics.span('page_load', kind=kind):
+            response = self.session.get(url, headers=headers, timeout=self.timeout, verify=self.verify)
+        # urllib3 keeps the retries it made for this response
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            metrics.incr('retries', len(retries.history), kind=kind)
+        if cached is not None and response.status_code == 304:
+            self.cache.refresh(url)
+            return cached['body']
+        response.raise_for_status()
+
+        if self.cache is not None:
+            self.cache.put(url, kind, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.text
+
+    def page(self, url, kind, parse):
+        html = self.fetch(url, kind)
+        with metrics.span('extract', kind=kind):
+            return parse(html, url)
+
+    def results_page(self, url):
+        return self.page(url, 'results', parse_results)
+
+    def detail_page(self, url):
+        return self.page(url, 'detail', parse_detail)
+
+    def permits_page(self, url):
+        return self.page(url, 'permits', parse_permits)
+
+    def close(self):
+        self.session.close()
+
+    def abort(self):
+        # Stops any further requests and retries, and drops idle connections.
+        # requests can't interrupt a call already waiting on the site: it runs
+        # until its timeout, on a worker thread the run no longer waits for
+        self.aborted.set()
+        self.session.close()
+
+
+BACKENDS = ('http', 'async', 'selenium')
+
+def make_backend(name='http', workers=1, cache=None, options=None):
+    # options are keyword arguments for the async backend, e.g.
+    # {'rate': 20, 'concurrency': 16}; the other backends take none
+    if name == 'http':
+        return HttpBackend(cache=cache)
+    if name == 'async':
+        from async_fetch import AsyncHttpBackend
+
+        return AsyncHttpBackend(cache=cache, **(options or {}))
+    if name == 'selenium':
+        from driver_pool import shared_pool
+        from selenium_backend import SeleniumBackend
+
+        # Size the shared browser pool so every worker can hold a driver
+        return SeleniumBackend(shared_pool(workers), cache=cache)
+    raise ValueError(f"Unknown backend: {name}")
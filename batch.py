@@ -0,0 +1,233 @@
+import threading
+
+from backends import make_backend
+from parsing import dentist_id, page_count
+from scheduler import PageScheduler, SharedResults
+from page_cache import PageCache
+from delta import RecordStore
+from sinks import COLUMNS, open_sink
+from filters import FilterPipeline
+from records import record_key
+from engine import DEFAULT_WORKERS, Callback, build_records, load_page, output_file, page_dentists, save_changes, save_metrics, search_url
+from metrics import metrics
+from control import RunController, join_workers, start_worker
+from geocode import GEO_COLUMNS
+from record_index import DEFAULT_INDEX_PATH, index_outputs
+
+# Batch runs over many cities and sedation filters through one worker pool.
+# Search results don't depend on the sedation filter, so every city is
+# searched once and its pages become work units on a shared scheduler. Each
+# dentist's detail page is fetched once per batch, however many cities list
+# them, and their locations are fanned out to every search they match.
+
+
+class DentistClaims:
+    # One fetch per dentist across the whole batch. The first worker to meet
+    # a dentist claims them and fans their locations out to every search, so
+    # the same dentist on another city's page is skipped
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.claimed = set()
+
+    def claim(self, row):
+        key = dentist_id(row['detail_url'])
+        with self.lock:
+            if key in self.claimed:
+                return False
+            self.claimed.add(key)
+            return True
+
+    def release(self, row):
+        # A failed fetch can be retried from another city's page
+        with self.lock:
+            self.claimed.discard(dentist_id(row['detail_url']))
+
+
+class DedupSink:
+    # Combined output: drops records another search already wrote
+    def __init__(self, sink):
+        self.sink = sink
+        self.lock = threading.Lock()
+        self.seen = set()
+
+    def write(self, records):
+        with self.lock:
+            fresh = []
+            for record in records:
+                key = record_key(record)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    fresh.append(record)
+            self.sink.write(fresh)
+
+
+class TaggedSink:
+    # Adds fixed columns, e.g. the sedation filter, before writing
+    def __init__(self, sink, tags):
+        self.sink = sink
+        self.tags = tags
+
+    def write(self, records):
+        self.sink.write([dict(record, **self.tags) for record in records])
+
+
+def batch_worker(worker, backend_name, scheduler, claims, jobs, first_pages, cache, store, pipeline, controller, geocoder, update_status,
+                 update_progress, backend_options=None):
+    quiet = Callback()
+    backend = None
+    try:
+        backend = make_backend(backend_name, len(scheduler.queues), cache, backend_options)
+        controller.track(backend)
+
+        def full():
+            return all(job['results'].full() for job in jobs)
+
+        while not full() and controller.proceed():
+            unit = scheduler.next_page(worker)
+            if unit is None:
+                break
+            city, number = unit
+
+            page = load_page(backend, first_pages[city], number, update_status, city)
+            if page is not None:
+                update_status.emit(f"Worker {worker + 1} scraping {city} page {number}")
+                metrics.incr('pages')
+                # Another city's page may already have fanned a dentist out
+                rows = [row for row in page['rows'][:10] if claims.claim(row)]
+                for row, detail, permits in page_dentists(backend, rows, store, pipeline, controller, update_status, full):
+                    if detail is None:
+                        # A failed fetch can be retried from another city's page
+                        claims.release(row)
+                        continue
+
+                    # Fan the dentist's locations out to every search they match
+                    found = 0
+                    for job in jobs:
+                        if job['results'].full():
+                            continue
+                        records = build_records(row['name'], detail, permits, job['city'], job['sedation'], quiet)
+                        if geocoder is not None and records:
+                            with metrics.span('geocode'):
+                                geocoder.enrich(records)
+                        job['results'].add((city, number), records)
+                        found += len(records)
+                    if found:
+                        update_status.emit(f"Found {found} records for dentist: {row['name']}")
+
+            # Pages finished, or the least complete search's share of the limit if further along
+            pages_done = scheduler.page_done()
+            update_progress.emit(int(100 * min(1.0, max(pages_done, min(job['results'].count / job['results'].limit for job in jobs)))))
+
+        if full():
+            scheduler.stop()
+    except Exception as e:
+        metrics.incr('errors', stage='worker')
+        update_status.emit(f"Worker {worker + 1} stopped: {e}")
+    finally:
+        if backend is not None:
+            controller.untrack(backend)
+            backend.close()
+
+def run_batch(cities, sedations, limit, workers=DEFAULT_WORKERS, backend='http', output_format='xlsx', combined_path=None,
+              use_cache=True, incremental=False, sedation_type='', metrics_path='batch_metrics.prom', controller=None, geocoder=None,
+              index_path=DEFAULT_INDEX_PATH, backend_options=None, on_status=None, on_progress=None):
+    # Returns {(city, sedation): record count}. Without combined_path every
+    # search is written to its own dentists_in_[city]_filtered file; with it,
+    # all searches go into that one file, deduplicated across cities. Every
+    # file written is added to the record index at index_path, None skips it.
+    # Incremental batches also write a changes file for every search.
+    update_status = Callback(on_status)
+    update_progress = Callback(on_progress)
+    if controller is None:
+        controller = RunController()
+    metrics.reset()
+    cities = list(dict.fromkeys(city.strip() for city in cities if city.strip()))
+
+    cache = PageCache() if use_cache else None
+    store = RecordStore() if incremental else None
+    sinks = []
+    outputs = []  # (path, sedation) for the record index
+    columns = COLUMNS + GEO_COLUMNS if geocoder is not None else COLUMNS
+    combined = None
+    if combined_path:
+        combined = open_sink(combined_path, output_format, columns + ['Sedation'])
+        sinks.append(combined)
+        outputs.append((combined_path, None))  # Sedation comes from its column
+        combined = DedupSink(combined)
+
+    jobs = []
+    try:
+        for city in cities:
+            for sedation in sedations:
+                if combined is not None:
+                    sink = TaggedSink(combined, {'Sedation': sedation})
+                else:
+                    suffix = 'filtered' if len(sedations) == 1 else f"{sedation.replace(' ', '_')}_filtered"
+                    path = output_file(city, output_format, suffix)
+                    sink = open_sink(path, output_format, columns)
+                    sinks.append(sink)
+                    outputs.append((path, sedation))
+                jobs.append({'city': city, 'sedation': sedation, 'results': SharedResults(limit, sink, keep=incremental)})
+
+        # Every city is searched once, whatever the number of sedation filters
+        first_pages = {}
+        units = []
+        first_backend = make_backend(backend, workers, cache, backend_options)
+        try:
+            for city in cities:
+                if not controller.proceed():
+                    break
+                try:
+                    first_pages[city] = first_backend.results_page(search_url(city, sedation_type))
+                except Exception as e:
+                    update_status.emit(f"Error loading search results for {city}: {e}")
+                    continue
+                total_pages = page_count(first_pages[city])
+                units.extend((city, number) for number in range(1, total_pages + 1))
+                update_status.emit(f"Found {total_pages} pages of results for {city}.")
+        finally:
+            first_backend.close()
+
+        workers = max(1, min(workers, len(units)))
+        update_status.emit(f"Scraping {len(units)} pages across {len(first_pages)} cities with {workers} workers.")
+
+        scheduler = PageScheduler(units, workers)
+        claims = DentistClaims()
+        # Dentists are only dropped early when no city or sedation filter of the batch can use them
+        pipeline = FilterPipeline(cities, sedations)
+        futures = [start_worker(batch_worker, worker, backend, scheduler, claims, jobs, first_pages, cache, store,
+                                pipeline, controller, geocoder, update_status, update_progress, backend_options)
+                   for worker in range(workers)]
+        join_workers(futures, controller, update_status)
+        for job in jobs:
+            job['results'].seal()
+
+        if controller.cancelled:
+            update_status.emit(f"Batch cancelled with {sum(job['results'].count for job in jobs)} records collected.")
+        update_status.emit(f"Fetched {len(claims.claimed)} distinct dentists for {len(jobs)} searches.")
+        update_status.emit(pipeline.summary())
+        if cache is not None:
+            update_status.emit(cache.summary())
+        if store is not None:
+            update_status.emit(store.summary())
+        if geocoder is not None:
+            update_status.emit(geocoder.summary())
+    finally:
+        for sink in sinks:
+            sink.close()
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            store.close()
+
+    # A cancelled batch only has part of the results, diffing it would report everything else as removed
+    if incremental and not controller.cancelled:
+        for job in jobs:
+            suffix = 'changes' if len(sedations) == 1 else f"{job['sedation'].replace(' ', '_')}_changes"
+            save_changes(job['city'], job['sedation'], job['results'].records(), output_format, update_status, suffix)
+
+    if index_path:
+        index_outputs(outputs, index_path, update_status)
+    save_metrics(metrics_path, update_status)
+    return {(job['city'], job['sedation']): job['results'].count for job in jobs}
+
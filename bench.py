@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows, psutil is used instead if installed
+    resource = None
+
+from backends import HttpBackend
+from fixture_server import save_fixture, start_fixture_server
+
+# Offline benchmarks. Record a corpus of search, detail and permit pages once:
+#   python bench.py record Etobicoke --sedation "Oral Moderate Sedation" --pages 5
+# then replay it from a local server with simulated latency as often as needed:
+#   python bench.py run --backends http async --workers 1 4 8 --latency 0.2 --jitter 0.1
+# Each backend and worker count runs in its own process so CPU time and peak
+# RSS belong to that run alone. Results are compared against bench_baseline.json
+# (written with --save-baseline) and the exit status is 1 on a regression or
+# when a run hits errors, which means the corpus doesn't cover the run.
+
+CORPUS_DIR = 'bench_corpus'
+BASELINE = 'bench_baseline.json'
+SITE = 'https://www.rcdso.org'
+
+
+class RecordingBackend(HttpBackend):
+    # Saves every page it fetches as a fixture. Absolute links back to the
+    # site are made relative so the replayed pages never leave the replay server
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.recorded = 0
+
+    def fetch(self, url, kind):
+        html = super().fetch(url, kind).replace(SITE, '')
+        parts = urlsplit(url)
+        save_fixture(self.directory, parts.path + ('?' + parts.query if parts.query else ''), html)
+        self.recorded += 1
+        return html
+
+
+def record(city, sedation, pages, directory):
+    from engine import search_url
+    from parsing import page_count, page_url
+
+    url = search_url(city)
+    backend = RecordingBackend(directory)
+    try:
+        first_page = backend.results_page(url)
+        total = min(page_count(first_page), pages)
+        for number in range(1, total + 1):
+            page = first_page if number == 1 else backend.results_page(page_url(first_page, number))
+            print(f"Recording page {number} of {total}: {len(page['rows'])} dentists", file=sys.stderr)
+            # Every dentist is recorded whatever the filters, so the corpus
+            # keeps working if the filter stages change
+            for row in page['rows']:
+                detail = backend.detail_page(row['detail_url'])
+                if detail['permits_url']:
+                    backend.permits_page(detail['permits_url'])
+    finally:
+        backend.close()
+
+    parts = urlsplit(url)
+    corpus = {'city': city, 'sedation': sedation, 'search': f"{parts.path}?{parts.query}", 'pages': total, 'recorded': time.time()}
+    with open(os.path.join(directory, 'corpus.json'), 'w', encoding='utf-8') as f:
+        json.dump(corpus, f, indent=2)
+    print(f"Recorded {backend.recorded} pages to {directory}", file=sys.stderr)
+
+def process_usage():
+    # (CPU seconds, peak RSS in MB) of this process, None where unavailable
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+        return usage.ru_utime + usage.ru_stime, rss / 2 ** 20
+    try:
+        import psutil
+    except ImportError:
+        return None, None
+    process = psutil.Process()
+    times = process.cpu_times()
+    memory = process.memory_info()
+    return times.user + times.system, getattr(memory, 'peak_wset', memory.rss) / 2 ** 20
+
+def run_one(addr, corpus, backend, workers, limit, backend_options=None):
+    # Runs in a child process, prints one JSON line with the run's numbers.
+    # Only the recorded pages are scraped, the rest of the site isn't in the corpus
+    from engine import Callback, get_dentists
+    from metrics import metrics
+
+    metrics.reset()
+    started = time.perf_counter()
+    dentists = get_dentists(addr + corpus['search'], limit, corpus['city'], corpus['sedation'], Callback(), Callback(),
+                            backend, workers, max_pages=corpus['pages'], backend_options=backend_options)
+    elapsed = time.perf_counter() - started
+
+    cpu_seconds, peak_rss_mb = process_usage()
+    return {
+        'backend': backend,
+        'workers': workers,
+        'seconds': elapsed,
+        'records': len(dentists),
+        'pages': metrics.count('pages'),
+        'dentists_per_sec': metrics.count('dentists') / elapsed,
+        'pages_per_sec': metrics.count('pages') / elapsed,
+        'cpu_seconds': cpu_seconds,
+        'peak_rss_mb': peak_rss_mb,
+        'errors': metrics.count('errors'),
+    }
+
+def run_config(addr, directory, backend, workers, limit, backend_options):
+    command = [sys.executable, os.path.abspath(__file__), 'one', addr, directory, backend, str(workers), str(limit)]
+    for name, value in backend_options.items():
+        command += [f"--{name}", str(value)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def compare(result, baseline, tolerance):
+    # Lower throughput or higher CPU/memory than the baseline by more than
+    # the tolerance counts as a regression
+    regressions = []
+    for key, higher_is_better in (('dentists_per_sec', True), ('pages_per_sec', True), ('cpu_seconds', False), ('peak_rss_mb', False)):
+        old, new = baseline.get(key), result[key]
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(f"{key} {old:.2f} -> {new:.2f} ({change:+.0%})")
+    return regressions
+
+def number(value, width, decimals):
+    return f"{value:>{width}.{decimals}f}" if value is not None else f"{'n/a':>{width}}"
+
+def run(directory, backends, worker_counts, latency, jitter, limit, repeat, baseline_path, save_baseline, tolerance, backend_options=None):
+    # backend_options (the async rate and concurrency) apply to the backends that take them
+    with open(os.path.join(directory, 'corpus.json'), encoding='utf-8') as f:
+        corpus = json.load(f)
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    server, addr = start_fixture_server(directory, latency=latency, jitter=jitter)
+    results = {}
+    failed = invalid = False
+    try:
+        print(f"{corpus['city']}, {corpus['pages']} pages, latency {latency}s + up to {jitter}s jitter")
+        print(f"{'config':<14}{'dentists/s':>11}{'pages/s':>9}{'cpu s':>8}{'rss MB':>8}{'records':>9}  vs baseline")
+        for backend in backends:
+            for workers in worker_counts:
+                key = f"{backend}/{workers}"
+                # The fastest of the repeats, the others only add noise
+                options = backend_options if backend == 'async' else {}
+                runs = [run_config(addr, directory, backend, workers, limit, options) for _ in range(repeat)]
+                result = max(runs, key=lambda run: run['dentists_per_sec'])
+                result.update(latency=latency, jitter=jitter, options=options)
+                results[key] = result
+
+                # Only runs replayed at the same simulated latency and backend settings are comparable
+                settings = (latency, jitter, options)
+                comparable = key in baseline and (baseline[key].get('latency'), baseline[key].get('jitter'),
+                                                  baseline[key].get('options', {})) == settings
+                regressions = compare(result, baseline[key], tolerance) if comparable else []
+                if result['errors'] or not result['pages']:
+                    # Failed requests would skew the numbers, so the run is neither compared nor saved
+                    verdict = f"INVALID: {result['errors']} errors, {result['pages']} pages scraped"
+                    regressions = []
+                    invalid = True
+                    del results[key]
+                elif comparable:
+                    verdict = 'REGRESSION: ' + ', '.join(regressions) if regressions else 'ok'
+                else:
+                    verdict = 'no baseline' if key not in baseline else 'baseline used other latency or backend settings'
+                failed = failed or bool(regressions)
+                print(f"{key:<14}{result['dentists_per_sec']:>11.1f}{result['pages_per_sec']:>9.2f}{number(result['cpu_seconds'], 8, 2)}"
+                      f"{number(result['peak_rss_mb'], 8, 1)}{result['records']:>9}  {verdict}")
+    finally:
+        server.shutdown()
+
+    if save_baseline:
+        baseline.update(results)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    return 1 if invalid or (failed and not save_baseline) else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench.py', description="Offline scraper benchmarks against a recorded corpus.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="Record a corpus from the live site")
+    record_parser.add_argument('city')
+    record_parser.add_argument('--sedation', required=True, help="Sedation filter the benchmark runs with")
+    record_parser.add_argument('--pages', type=int, default=5, help="Results pages to record (default 5)")
+    record_parser.add_argument('--dir', default=CORPUS_DIR)
+
+    run_parser = commands.add_parser('run', help="Replay the corpus and compare against the baseline")
+    run_parser.add_argument('--dir', default=CORPUS_DIR)
+    run_parser.add_argument('--backends', nargs='+', default=['http', 'async'])
+    run_parser.add_argument('--workers', nargs='+', type=int, default=[1, 4, 8])
+    run_parser.add_argument('--latency', type=float, default=0.1, help="Seconds added to every response (default 0.1)")
+    run_parser.add_argument('--jitter', type=float, default=0.05, help="Random extra delay of up to this many seconds (default 0.05)")
+    run_parser.add_argument('--rate', type=float, help="Async backend requests per second, 0 for no limit (default: the backend's)")
+    run_parser.add_argument('--concurrency', type=int, help="Async backend connections across all workers (default: the backend's)")
+    run_parser.add_argument('--limit', type=int, default=100000, help="Record limit passed to the scraper (default: no practical limit)")
+    run_parser.add_argument('--repeat', type=int, default=1, help="Runs per configuration, the best one is kept")
+    run_parser.add_argument('--baseline', default=BASELINE)
+    run_parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    run_parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed change before a regression is reported (default 0.1)")
+
+    one_parser = commands.add_parser('one')
+    for name in ('addr', 'dir', 'backend'):
+        one_parser.add_argument(name)
+    one_parser.add_argument('workers', type=int)
+    one_parser.add_argument('limit', type=int)
+    one_parser.add_argument('--rate', type=float)
+    one_parser.add_argument('--concurrency', type=int)
+
+    args = parser.parse_args(argv)
+    backend_options = {}
+    if args.command in ('run', 'one'):
+        backend_options = {name: value for name, value in (('rate', args.rate), ('concurrency', args.concurrency)) if value is not None}
+    if args.command == 'record':
+        record(args.city, args.sedation, args.pages, args.dir)
+        return 0
+    if args.command == 'one':
+        with open(os.path.join(args.dir, 'corpus.json'), encoding='utf-8') as f:
+            corpus = json.load(f)
+        print(json.dumps(run_one(args.addr, corpus, args.backend, args.workers, args.limit, backend_options)))
+        return 0
+    return run(args.dir, args.backends, args.workers, args.latency, args.jitter, args.limit, args.repeat,
+               args.baseline, args.save_baseline, args.tolerance, backend_options)
+
+if __name__ == "__main__":
+    sys.exit(main())
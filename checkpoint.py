@@ -0,0 +1,111 @@
+import json
+import os
+import re
+import threading
+import time
+
+from parsing import dentist_id
+
+# Append-only progress journal for a search. Workers log every dentist they
+# process and every page they finish, flushing as they go, so a crashed or
+# closed run can be resumed without redoing finished work.
+
+CHECKPOINT_DIR = 'checkpoints'
+
+
+def journal_path(search_city, sedation_check, directory=CHECKPOINT_DIR):
+    slug = re.sub(r'[^a-z0-9]+', '_', f"{search_city} {sedation_check}".lower()).strip('_')
+    return os.path.join(directory, f"{slug}.jsonl")
+
+def read_journal(path):
+    # Rebuild progress from the journal. A torn last line from a crash is ignored
+    state = {'pages': set(), 'dentists': {}, 'finished': False}
+    if not os.path.exists(path):
+        return state
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry['event'] == 'start':
+                state = {'pages': set(), 'dentists': {}, 'finished': False}
+            elif entry['event'] == 'dentist':
+                state['dentists'].setdefault(entry['page'], {})[entry['id']] = entry['records']
+            elif entry['event'] == 'page':
+                state['pages'].add(entry['page'])
+            elif entry['event'] == 'finished':
+                state['finished'] = True
+    return state
+
+
+def ends_mid_line(path):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+
+class Journal:
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+
+        state = read_journal(path) if resume else None
+        if state is not None and not state['finished']:
+            self.pages = state['pages']
+            self.dentists = state['dentists']
+            mode = 'a'
+        else:
+            # A fresh run, or the last run finished: start a new journal
+            self.pages = set()
+            self.dentists = {}
+            mode = 'w'
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, mode, encoding='utf-8')
+        if mode == 'w':
+            self.write({'event': 'start'})
+        elif ends_mid_line(path):
+            # Terminate a line torn by a crash so the next entry starts cleanly
+            self.file.write('\n')
+
+    @property
+    def resumed(self):
+        return bool(self.pages or self.dentists)
+
+    def write(self, entry):
+        entry['time'] = time.time()
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def is_done(self, page_number, row):
+        return dentist_id(row['detail_url']) in self.dentists.get(page_number, {})
+
+    def dentist_done(self, page_number, row, records):
+        with self.lock:
+            self.dentists.setdefault(page_number, {})[dentist_id(row['detail_url'])] = records
+        self.write({'event': 'dentist', 'page': page_number, 'id': dentist_id(row['detail_url']), 'records': records})
+
+    def page_done(self, page_number):
+        with self.lock:
+            self.pages.add(page_number)
+        self.write({'event': 'page', 'page': page_number})
+
+    def restore(self, results):
+        # Put the records of every journalled dentist back into the results
+        for page_number, dentists in self.dentists.items():
+            for records in dentists.values():
+                results.add(page_number, records)
+
+    def finish(self):
+        # The run completed, so a later resume starts over
+        self.write({'event': 'finished'})
+
+    def close(self):
+        with self.lock:
+            self.file.close()
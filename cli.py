@@ -0,0 +1,135 @@
+import argparse
+import signal
+import sys
+
+from async_fetch import DEFAULT_CONCURRENCY, DEFAULT_RATE
+from backends import BACKENDS
+from control import SHUTDOWN_TIMEOUT, RunController
+from engine import DEFAULT_WORKERS, output_file, scrape
+from record_index import DEFAULT_INDEX_PATH
+from sinks import FORMATS
+
+# Headless command line entry point: python cli.py Etobicoke --sedation "Oral Moderate" --limit 150
+# Several cities or sedation filters run as one batch through a shared worker pool.
+# Ctrl+C stops the run and keeps what was collected; on POSIX systems
+# `kill -USR1 <pid>` pauses and resumes it.
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='rcdso-scrape', description="Scrape dentists from the RCDSO find-a-dentist search.")
+    parser.add_argument('cities', nargs='*', metavar='city', help="City to search, e.g. Etobicoke")
+    parser.add_argument('--cities-file', help="File with one city per line, added to the cities given")
+    parser.add_argument('--sedation', required=True, action='append', help="Sedation type to filter by, e.g. \"Oral Moderate Sedation\". Repeat for several")
+    parser.add_argument('--sedation-type', default='', metavar='CODE', help="Site SedationType code, narrows the search on the site itself")
+    parser.add_argument('--limit', type=int, default=150, help="Maximum number of records to collect per search (default 150)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f"Pages scraped in parallel (default {DEFAULT_WORKERS})")
+    parser.add_argument('--backend', choices=BACKENDS, default='http', help="Fetch backend (default http)")
+    parser.add_argument('--rate', type=float,
+                        help=f"Async backend: requests per second to the site across all workers, 0 for no limit (default {DEFAULT_RATE})")
+    parser.add_argument('--concurrency', type=int,
+                        help=f"Async backend: connections open to the site at once, across all workers (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--format', choices=FORMATS, default='xlsx', help="Output format (default xlsx)")
+    parser.add_argument('--output', help="Output file for a single search (default dentists_in_[CITY]_filtered.[FORMAT])")
+    parser.add_argument('--combined', metavar='PATH', help="Write every search of a batch into this one file")
+    parser.add_argument('--geocode', metavar='CENTROIDS', help="Add Latitude/Longitude from a postal code centroid CSV (postal_code, latitude, longitude)")
+    parser.add_argument('--metrics', metavar='PATH', help="Run metrics file, Prometheus text or .json (default dentists_in_[CITY]_metrics.prom, batch_metrics.prom for batches)")
+    parser.add_argument('--no-index', action='store_true', help="Don't add the output to the record index queried by record_index.py")
+    parser.add_argument('--no-cache', action='store_true', help="Don't reuse pages cached by earlier runs")
+    parser.add_argument('--incremental', action='store_true', help="Skip unchanged dentists and write a changes file per search")
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted single-search run from its checkpoint")
+    parser.add_argument('--stop-timeout', type=float, default=SHUTDOWN_TIMEOUT,
+                        help=f"Seconds to wait for workers after Ctrl+C before aborting their requests (default {SHUTDOWN_TIMEOUT})")
+    parser.add_argument('--quiet', action='store_true', help="Only print the final summary")
+    return parser
+
+def install_signals(controller):
+    def interrupt(signum, frame):
+        # A second Ctrl+C quits without waiting
+        if controller.cancelled:
+            raise KeyboardInterrupt
+        print("Stopping after the current dentists, press Ctrl+C again to quit now...", file=sys.stderr, flush=True)
+        controller.cancel()
+
+    def toggle_pause(signum, frame):
+        if controller.paused:
+            controller.resume()
+            print("Resumed.", file=sys.stderr, flush=True)
+        else:
+            controller.pause()
+            print("Paused, send SIGUSR1 again to resume.", file=sys.stderr, flush=True)
+
+    signal.signal(signal.SIGINT, interrupt)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, toggle_pause)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    cities = list(args.cities)
+    if args.cities_file:
+        with open(args.cities_file, encoding='utf-8') as f:
+            cities.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not cities:
+        parser.error("at least one city is required")
+    if args.limit <= 0:
+        print("Error: --limit must be a positive integer.", file=sys.stderr)
+        return 2
+    if args.workers <= 0:
+        print("Error: --workers must be a positive integer.", file=sys.stderr)
+        return 2
+    if (args.rate is not None or args.concurrency is not None) and args.backend != 'async':
+        parser.error("--rate and --concurrency only apply to --backend async")
+    if (args.rate is not None and args.rate < 0) or (args.concurrency is not None and args.concurrency <= 0):
+        parser.error("--rate can't be negative and --concurrency must be positive")
+    # Only single searches keep a checkpoint or take an output path
+    if len(cities) > 1 or len(args.sedation) > 1 or args.combined:
+        if args.resume:
+            parser.error("--resume only applies to a single search")
+        if args.output:
+            parser.error("--output only applies to a single search, use --combined to write a batch into one file")
+
+    controller = RunController(args.stop_timeout)
+    install_signals(controller)
+
+    geocoder = None
+    if args.geocode:
+        from geocode import CentroidProvider, GeocodeCache, Geocoder
+
+        geocoder = Geocoder(CentroidProvider(args.geocode), GeocodeCache())
+    try:
+        return run(args, cities, controller, geocoder)
+    finally:
+        if geocoder is not None:
+            geocoder.cache.close()
+
+def run(args, cities, controller, geocoder):
+    def on_status(message):
+        if not args.quiet:
+            print(message, file=sys.stderr, flush=True)
+
+    backend_options = {name: value for name, value in (('rate', args.rate), ('concurrency', args.concurrency)) if value is not None}
+    if len(cities) > 1 or len(args.sedation) > 1 or args.combined:
+        from batch import run_batch
+
+        counts = run_batch(cities, args.sedation, args.limit, args.workers, args.backend, args.format, args.combined,
+                           use_cache=not args.no_cache, incremental=args.incremental, sedation_type=args.sedation_type,
+                           metrics_path=args.metrics or 'batch_metrics.prom', controller=controller, geocoder=geocoder,
+                           index_path=None if args.no_index else DEFAULT_INDEX_PATH, backend_options=backend_options,
+                           on_status=on_status)
+        for (city, sedation), count in counts.items():
+            print(f"{city} / {sedation}: {count} records")
+        if args.combined:
+            print(f"Data saved to {args.combined}")
+        return 130 if controller.cancelled else 0
+
+    output_path = args.output or output_file(cities[0], args.format)
+    scrape(cities[0], args.sedation[0], args.limit, args.workers, args.backend, args.format, output_path,
+           use_cache=not args.no_cache, incremental=args.incremental, resume=args.resume, keep_records=False,
+           sedation_type=args.sedation_type, metrics_path=args.metrics, controller=controller, geocoder=geocoder,
+           index_path=None if args.no_index else DEFAULT_INDEX_PATH, backend_options=backend_options, on_status=on_status)
+    print(f"Data saved to {output_path}")
+    return 130 if controller.cancelled else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import Future, wait
+
+# Run control shared by every worker of a run. Workers call proceed() between
+# pages and between dentists: it blocks while the run is paused and returns
+# False once it is cancelled, so a cancelled run stops after the dentist each
+# worker is on. Whatever was collected is kept and flushed as usual.
+
+SHUTDOWN_TIMEOUT = 10  # Seconds workers get to wind down after a cancel
+POLL_INTERVAL = 0.2
+
+
+class RunController:
+    def __init__(self, shutdown_timeout=SHUTDOWN_TIMEOUT):
+        self.shutdown_timeout = shutdown_timeout
+        self.lock = threading.Lock()
+        self.running = threading.Event()  # Cleared while paused
+        self.running.set()
+        self.stopping = threading.Event()
+        self.cancelled_at = None
+        self.backends = set()
+
+    @property
+    def cancelled(self):
+        return self.stopping.is_set()
+
+    @property
+    def paused(self):
+        return not self.running.is_set() and not self.cancelled
+
+    def cancel(self):
+        with self.lock:
+            if self.cancelled_at is None:
+                self.cancelled_at = time.monotonic()
+        self.stopping.set()
+        self.running.set()  # Wake paused workers so they can stop
+
+    def pause(self):
+        if not self.cancelled:
+            self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def proceed(self):
+        self.running.wait()
+        return not self.cancelled
+
+    def track(self, backend):
+        with self.lock:
+            self.backends.add(backend)
+
+    def untrack(self, backend):
+        with self.lock:
+            self.backends.discard(backend)
+
+    def overdue(self):
+        with self.lock:
+            return self.cancelled_at is not None and time.monotonic() - self.cancelled_at > self.shutdown_timeout
+
+    def abort(self):
+        # Cut off backends still busy after the shutdown timeout. Quitting a
+        # browser fails the call in flight; the HTTP backends cancel what
+        # they can and stop making requests (see their abort())
+        with self.lock:
+            backends = list(self.backends)
+        for backend in backends:
+            abort = getattr(backend, 'abort', None)
+            if abort is not None:
+                try:
+                    abort()
+                except Exception:
+                    pass
+
+
+def start_worker(function, *args):
+    # Like executor.submit(), but on a daemon thread. A worker left behind
+    # on a request that can't be interrupted doesn't keep the process alive
+    # at exit, as ThreadPoolExecutor threads would
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+def join_workers(futures, controller, update_status):
+    # Wait for every worker. After a cancel, workers that haven't stopped
+    # within the shutdown timeout have their backends aborted and are then
+    # left behind, so the run always returns in bounded time. Workers should
+    # be started with start_worker() so they don't hold up the process either
+    pending = set(futures)
+    while pending:
+        _, pending = wait(pending, timeout=POLL_INTERVAL)
+        if pending and controller.overdue():
+            update_status.emit(f"{len(pending)} workers still busy after {controller.shutdown_timeout}s, aborting their requests...")
+            controller.abort()
+            _, pending = wait(pending, timeout=POLL_INTERVAL * 10)
+            if pending:
+                update_status.emit(f"Leaving {len(pending)} workers behind.")
+            return not pending
+    return True
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+import threading
+import time
+
+from parsing import dentist_id
+from records import record_key
+
+# Record store for incremental runs. Every dentist is kept under its stable
+# detail page identifier with the fingerprint of its results row and the
+# parsed detail and permit pages. When the row hasn't changed, the stored
+# pages are reused instead of visiting the detail page again. Each search
+# also keeps a snapshot of its output so a run can report what changed.
+
+DEFAULT_STORE_PATH = 'dentists.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dentists (
+    id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    name TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    permits TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    search TEXT PRIMARY KEY,
+    records TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def search_key(search_city, sedation_check):
+    return f"{search_city.strip().lower()}|{sedation_check.strip().lower()}"
+
+def diff_records(old, new):
+    # Records are matched on the normalized key used for deduplication, so
+    # each location of a dentist is its own entry and a respelled address is
+    # reported as changed rather than as an add plus a remove
+    old_by_key = {record_key(record): record for record in old}
+    new_by_key = {record_key(record): record for record in new}
+
+    added = [record for key, record in new_by_key.items() if key not in old_by_key]
+    removed = [record for key, record in old_by_key.items() if key not in new_by_key]
+    changed = [record for key, record in new_by_key.items() if key in old_by_key and old_by_key[key] != record]
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+class RecordStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats = {'reused': 0, 'fetched': 0}
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def lookup(self, row):
+        # Returns the stored (detail, permits) when the results row is unchanged
+        with self.lock:
+            stored = self.connection.execute('SELECT fingerprint, detail, permits FROM dentists WHERE id = ?',
+                                             (dentist_id(row['detail_url']),)).fetchone()
+            if stored is None or stored[0] != row['fingerprint']:
+                self.stats['fetched'] += 1
+                return None
+            self.stats['reused'] += 1
+
+        detail = json.loads(stored[1])
+        permits = json.loads(stored[2]) if stored[2] is not None else None
+        return detail, permits
+
+    def save(self, row, detail, permits):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO dentists (id, fingerprint, name, detail, permits, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (dentist_id(row['detail_url']), row['fingerprint'], row['name'], json.dumps(detail),
+                 json.dumps(permits) if permits is not None else None, time.time()))
+            self.connection.commit()
+
+    def snapshot(self, search, records):
+        # Store this run's output and return what changed since the last one
+        with self.lock:
+            previous = self.connection.execute('SELECT records FROM snapshots WHERE search = ?', (search,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO snapshots (search, records, created_at) VALUES (?, ?, ?)',
+                                    (search, json.dumps(records), time.time()))
+            self.connection.commit()
+
+        old = json.loads(previous[0]) if previous is not None else []
+        return diff_records(old, records)
+
+    def summary(self):
+        return f"Record store: {self.stats['reused']} unchanged dentists reused, {self.stats['fetched']} fetched"
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
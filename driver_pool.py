@@ -0,0 +1,155 @@
+import atexit
+import os
+import threading
+from functools import lru_cache
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+
+from metrics import metrics
+
+# Long-lived pool of Chrome sessions shared by every worker and every run in
+# the process. Drivers are leased, returned, health checked and recycled
+# after a number of page loads or when they crash.
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_PAGES = 200
+
+
+# Resolve the ChromeDriver executable once per process
+@lru_cache(maxsize=None)
+def chrome_driver_path():
+    # Get the path to the ChromeDriver executable
+    chrome_driver_path = ChromeDriverManager().install()
+
+    # Ensure we're using the correct executable
+    if chrome_driver_path.endswith('THIRD_PARTY_NOTICES.chromedriver'):
+        chrome_driver_path = os.path.dirname(chrome_driver_path)
+        chrome_driver_path = os.path.join(chrome_driver_path, 'chromedriver.exe')
+
+    # Print the path for debugging
+    print(f"ChromeDriver path: {chrome_driver_path}")
+
+    # Check if the file exists
+    if not os.path.exists(chrome_driver_path):
+        raise FileNotFoundError(f"ChromeDriver not found at {chrome_driver_path}")
+
+    return chrome_driver_path
+
+# Setup Selenium WebDriver
+def setup_driver(headless=True):
+    options = Options()
+    options.add_argument('--ignore-certificate-errors')  # Ignore SSL certificate errors
+    if headless:
+        options.add_argument('--headless=new')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--window-size=1280,1024')
+
+    # Create the Service object with the ChromeDriver path
+    service = Service(chrome_driver_path())
+
+    # Create the driver with the service and options
+    with metrics.span('driver_startup'):
+        return webdriver.Chrome(service=service, options=options)
+
+def is_healthy(driver):
+    try:
+        driver.execute_script("return 1;")
+        return True
+    except Exception:
+        return False
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class DriverPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE, headless=True, max_pages=DEFAULT_MAX_PAGES):
+        self.size = size
+        self.headless = headless
+        self.max_pages = max_pages
+        self.condition = threading.Condition()
+        self.idle = []
+        self.pages = {}
+        self.leased = 0
+        self.closed = False
+
+    def lease(self):
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self.idle:
+                    driver = self.idle.pop()
+                    self.leased += 1
+                    break
+                if self.leased + len(self.idle) < self.size:
+                    driver = None
+                    self.leased += 1
+                    break
+                self.condition.wait()
+
+        if driver is not None and is_healthy(driver):
+            return driver
+        if driver is not None:
+            self.discard(driver)
+
+        # Launch outside the lock so other workers can lease meanwhile
+        try:
+            driver = setup_driver(self.headless)
+        except Exception:
+            with self.condition:
+                self.leased -= 1
+                self.condition.notify()
+            raise
+        self.pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, pages=0, crashed=False):
+        pages = self.pages.get(id(driver), 0) + pages
+        recycle = crashed or pages >= self.max_pages or not is_healthy(driver)
+
+        if recycle:
+            self.discard(driver)
+        with self.condition:
+            self.leased -= 1
+            if not recycle:
+                if self.closed:
+                    quit_driver(driver)
+                else:
+                    self.pages[id(driver)] = pages
+                    self.idle.append(driver)
+            self.condition.notify()
+
+    def discard(self, driver):
+        self.pages.pop(id(driver), None)
+        quit_driver(driver)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.condition.notify_all()
+        for driver in idle:
+            self.discard(driver)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def shared_pool(size=DEFAULT_POOL_SIZE):
+    # One pool per process so browsers stay warm between runs
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = DriverPool(size)
+            atexit.register(_shared_pool.close)
+        elif _shared_pool.size < size:
+            with _shared_pool.condition:
+                _shared_pool.size = size
+                _shared_pool.condition.notify_all()
+        return _shared_pool
@@ -0,0 +1,409 @@
+import os
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from backends import make_backend
+from parsing import page_count, page_url
+from scheduler import PageScheduler, SharedResults
+from page_cache import PageCache
+from delta import RecordStore, search_key
+from checkpoint import Journal, journal_path
+from sinks import COLUMNS, open_sink
+from records import city_matcher
+from filters import FilterPipeline, wants_permits
+from metrics import metrics
+from control import RunController, join_workers, start_worker
+from geocode import GEO_COLUMNS
+from record_index import DEFAULT_INDEX_PATH, index_outputs
+
+# Scraping engine and library entry point. Nothing here imports Qt or
+# Selenium, so the CLI and cron jobs start without either; progress is
+# reported through plain callbacks.
+
+# Number of scraping workers when none is given
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Define the base URL for scraping
+base_url = "https://www.rcdso.org/find-a-dentist/search-results?Alpha=&City={}&MbrSpecialty=&ConstitID=&AlphaParent=&Address1=&PhoneNum=&SedationType=&SedationProviderType=&GroupCode=&DetailsCode="
+
+def search_url(search_city, sedation_type='', specialty=''):
+    # Fill in the search form's own filters so the site drops dentists before
+    # they reach a results page. Values are the site's option codes
+    url = base_url.format(search_city)
+    if not sedation_type and not specialty:
+        return url
+    parts = urlsplit(url)
+    filters = {'SedationType': sedation_type, 'MbrSpecialty': specialty}
+    query = [(key, filters.get(key) or value) for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def build_records(name, detail, permits, search_city, sedation_check, update_status):
+    # Apply the dentist filters to a detail page and its facility permits
+    if detail['specialty'] is not None:
+        metrics.incr('skips', reason='specialty')
+        update_status.emit(f"Specialty found for dentist: {name}, skipping...")
+        return []
+
+    if not detail['primary_practice']:
+        metrics.incr('skips', reason='primary_practice')
+        update_status.emit(f"No Primary Practice section for dentist: {name}, skipping...")
+        return []
+
+    if permits is not None:
+        sedation_type = permits['sedation_type']
+        if sedation_type is None:
+            metrics.incr('skips', reason='no_sedation_type')
+            update_status.emit(f"No sedation type found for dentist: {name}, skipping...")
+            return []
+        update_status.emit(f"Sedation type found for dentist {name}: {sedation_type}")
+        if sedation_check not in sedation_type:
+            metrics.incr('skips', reason='sedation')
+            update_status.emit(f"Sedation type {sedation_type} does not contain {sedation_check}, skipping...")
+            return []
+
+    records = []
+    matches_city = city_matcher(search_city)
+    for location in detail['locations']:
+        if location['city_state_zip']:
+            if not matches_city(location['city_state_zip']):
+                continue  # Skip locations not matching the search city
+            city = f"{search_city} ON {location['zip_code']}"
+        else:
+            city = ''
+
+        records.append({
+            'Name': name,
+            'Business Name': location['business_name'],
+            'Address': location['address'],
+            'City': city
+        })
+        update_status.emit(f"Found dentist: {name}, {location['business_name']}, {location['address']}, {city}")
+    if not records:
+        metrics.incr('skips', reason='city')
+    return records
+
+def fetch_dentist(backend, row, store=None, pipeline=None):
+    # Reuse the stored pages when the dentist's results row hasn't changed
+    stored = store.lookup(row) if store is not None else None
+    if stored is not None:
+        return stored
+
+    if pipeline is None:
+        pipeline = FilterPipeline()
+    with metrics.span('dentist_fetch', kind='detail') as span:
+        detail = backend.detail_page(row['detail_url'])
+    pipeline.fetched('detail', span.seconds)
+
+    # The permits page is only worth loading for dentists that passed every detail stage
+    permits = None
+    if pipeline.needs_permits(detail):
+        with metrics.span('dentist_fetch', kind='permits') as span:
+            permits = backend.permits_page(detail['permits_url'])
+        pipeline.fetched('permits', span.seconds)
+        pipeline.check_permits(permits)
+    if store is not None and (permits is not None or not wants_permits(detail)):
+        store.save(row, detail, permits)
+    return detail, permits
+
+def prefetch_dentists(backend, rows, store=None, pipeline=None):
+    # Backends that can fetch a whole page of dentists concurrently do it up
+    # front; the rest fetch one dentist at a time in the scraping loop
+    if not hasattr(backend, 'fetch_dentists'):
+        return {}
+
+    prefetched = {}
+    pending = []
+    for row in rows:
+        stored = store.lookup(row) if store is not None else None
+        if stored is not None:
+            prefetched[row['detail_url']] = stored
+        else:
+            pending.append(row)
+
+    fetched = backend.fetch_dentists(pending, pipeline or FilterPipeline())
+    if store is not None:
+        for row in pending:
+            result = fetched[row['detail_url']]
+            if not isinstance(result, Exception) and (result[1] is not None or not wants_permits(result[0])):
+                store.save(row, *result)
+    prefetched.update(fetched)
+    return prefetched
+
+def prefetched_dentist(prefetched, row):
+    fetched = prefetched.get(row['detail_url'])
+    if isinstance(fetched, Exception):
+        raise fetched
+    return fetched
+
+def scrape_current_page(backend, page, page_number, results, search_city, sedation_check, update_status, store=None, journal=None, pipeline=None,
+                        controller=None, geocoder=None):
+    rows = page['rows']
+    metrics.incr('pages')
+    update_status.emit(f"Found {len(rows)} visible items on page {page_number}.")
+
+    if not rows:
+        update_status.emit("No visible dentist search results found.")
+        return False
+
+    # Process 10 results at a time. Dentists journalled by an interrupted
+    # run are already in the results
+    rows = [row for row in rows[:10] if journal is None or not journal.is_done(page_number, row)]
+    if pipeline is None:
+        pipeline = FilterPipeline([search_city], [sedation_check])
+
+    errors = 0
+    for row, detail, permits in page_dentists(backend, rows, store, pipeline, controller, update_status, results.full):
+        if detail is None:
+            errors += 1
+            continue
+        try:
+            records = build_records(row['name'], detail, permits, search_city, sedation_check, update_status)
+            if geocoder is not None and records:
+                with metrics.span('geocode'):
+                    geocoder.enrich(records)
+            results.add(page_number, records)
+            if journal is not None:
+                journal.dentist_done(page_number, row, records)
+        except Exception as e:
+            errors += 1
+            metrics.incr('errors', stage='dentist')
+            update_status.emit(f"Error parsing dentist entry {row['name']}: {e}")
+
+    # A page cut short stays open in the journal, as do pages with failed
+    # dentists, so a resumed run retries them
+    if results.full() or (controller is not None and controller.cancelled):
+        return False
+    if journal is not None and not errors:
+        journal.page_done(page_number)
+    return True
+
+def page_dentists(backend, rows, store, pipeline, controller, update_status, full):
+    # The dentists of a results page in order, as (row, detail, permits).
+    # Rows the results row rules out are dropped before anything is fetched,
+    # and backends that can fetch the rest at once do so. Dentists that fail
+    # are reported and yielded with detail None. Stops early once full() is
+    # true or the run is cancelled, and blocks while it is paused
+    wanted = []
+    for row in rows:
+        if pipeline.check_row(row):
+            wanted.append(row)
+        else:
+            metrics.incr('skips', reason='row_specialty')
+            update_status.emit(f"Specialty listed for dentist: {row['name']}, skipping...")
+    prefetched = prefetch_dentists(backend, wanted, store, pipeline)
+
+    for row in wanted:
+        if full():
+            return
+        if controller is not None and not controller.proceed():
+            return
+
+        metrics.incr('dentists')
+        try:
+            detail, permits = prefetched_dentist(prefetched, row) or fetch_dentist(backend, row, store, pipeline)
+        except Exception as e:
+            metrics.incr('errors', stage='dentist')
+            update_status.emit(f"Error parsing dentist entry {row['name']}: {e}")
+            yield row, None, None
+            continue
+        yield row, detail, permits
+
+def load_page(backend, first_page, number, update_status, city=None):
+    # city only labels the messages, for batches that page through several searches
+    where = f"{city} page {number}" if city else f"page {number}"
+    if number == 1:
+        return first_page
+    url = page_url(first_page, number)
+    if url is None:
+        update_status.emit(f"Could not build the URL for {where}, skipping...")
+        return None
+    try:
+        return backend.results_page(url)
+    except Exception as e:
+        metrics.incr('errors', stage='results')
+        update_status.emit(f"Error loading {where}: {e}")
+        return None
+
+def progress_percent(pages_done, results):
+    # Share of the pages finished, or of the limit collected if that is further along
+    collected = results.count / results.limit if results.limit else 0
+    return int(100 * min(1.0, max(pages_done, collected)))
+
+def scrape_worker(worker, backend_name, scheduler, results, first_page, search_city, sedation_check, update_status, update_progress, backend=None, cache=None, store=None, journal=None,
+                  pipeline=None, controller=None, geocoder=None, backend_options=None):
+    if controller is None:
+        controller = RunController()
+    try:
+        if backend is None:
+            backend = make_backend(backend_name, len(scheduler.queues), cache, backend_options)
+        controller.track(backend)
+
+        while not results.full() and controller.proceed():
+            number = scheduler.next_page(worker)
+            if number is None:
+                break
+
+            page = load_page(backend, first_page, number, update_status)
+            if page is not None:
+                update_status.emit(f"Worker {worker + 1} scraping page {number}")
+                scrape_current_page(backend, page, number, results, search_city, sedation_check, update_status, store, journal, pipeline,
+                                    controller, geocoder)
+            update_progress.emit(progress_percent(scheduler.page_done(), results))
+
+        # Stop every other worker once the shared limit is reached
+        if results.full():
+            scheduler.stop()
+    except Exception as e:
+        metrics.incr('errors', stage='worker')
+        update_status.emit(f"Worker {worker + 1} stopped: {e}")
+    finally:
+        if backend is not None:
+            controller.untrack(backend)
+            backend.close()
+
+def get_dentists(url, limit, search_city, sedation_check, update_status, update_progress, backend='http', workers=4, cache=None, store=None, journal=None,
+                 sink=None, keep_records=True, controller=None, geocoder=None, max_pages=None, backend_options=None):
+    # max_pages caps the pages scraped, e.g. to the pages a benchmark corpus
+    # recorded. backend_options go to make_backend, e.g. the async rate
+    if controller is None:
+        controller = RunController()
+    results = SharedResults(limit, sink, keep_records)
+    done_pages = set()
+    if journal is not None and journal.resumed:
+        journal.restore(results)
+        done_pages = journal.pages
+        update_status.emit(f"Resuming from checkpoint: {len(done_pages)} pages and {results.count} records already done.")
+        if results.full():
+            journal.finish()
+            return results.records()
+
+    first_backend = make_backend(backend, workers, cache, backend_options)
+
+    update_status.emit(f"Fetching data from URL: {url}")
+    try:
+        first_page = first_backend.results_page(url)
+    except Exception as e:
+        metrics.incr('errors', stage='results')
+        update_status.emit(f"Error loading search results: {e}")
+        first_backend.close()
+        return []
+
+    total_pages = page_count(first_page)
+    if max_pages:
+        total_pages = min(total_pages, max_pages)
+    pages = [number for number in range(1, total_pages + 1) if number not in done_pages]
+    workers = max(1, min(workers, len(pages)))
+    update_status.emit(f"Found {total_pages} pages of results, scraping {len(pages)} with {workers} workers.")
+
+    scheduler = PageScheduler(pages, workers)
+    pipeline = FilterPipeline([search_city], [sedation_check])
+    # The first worker reuses the backend that loaded page 1
+    futures = [start_worker(scrape_worker, worker, backend, scheduler, results, first_page, search_city, sedation_check,
+                            update_status, update_progress, first_backend if worker == 0 else None, cache, store, journal,
+                            pipeline, controller, geocoder, backend_options)
+               for worker in range(workers)]
+    join_workers(futures, controller, update_status)
+    results.seal()
+
+    if controller.cancelled:
+        update_status.emit(f"Run cancelled with {results.count} records collected.")
+    else:
+        # Every page is done or the limit was reached, so there is nothing left to resume
+        if journal is not None and (results.full() or len(journal.pages) >= total_pages):
+            journal.finish()
+        update_progress.emit(100)
+    update_status.emit(pipeline.summary())
+    if cache is not None:
+        update_status.emit(cache.summary())
+    if store is not None:
+        update_status.emit(store.summary())
+    if geocoder is not None:
+        update_status.emit(geocoder.summary())
+    return results.records()
+
+
+class Callback:
+    # Adapts a plain function to the emit() interface the workers report through
+    def __init__(self, function=None):
+        self.function = function
+
+    def emit(self, value):
+        if self.function is not None:
+            self.function(value)
+
+def output_file(search_city, output_format, suffix='filtered'):
+    return f'dentists_in_{search_city}_{suffix}.{output_format}'
+
+def save_changes(search_city, sedation_check, dentists, output_format, update_status, suffix='changes'):
+    # Diff against the previous run of the same search
+    store = RecordStore()
+    try:
+        changes = store.snapshot(search_key(search_city, sedation_check), dentists)
+    finally:
+        store.close()
+
+    changes_file_path = output_file(search_city, output_format, suffix)
+    sink = open_sink(changes_file_path, columns=['Change'] + COLUMNS)
+    for change in ('added', 'removed', 'changed'):
+        sink.write([dict(record, Change=change) for record in changes[change]])
+    sink.close()
+    update_status.emit(f"{len(changes['added'])} added, {len(changes['removed'])} removed, "
+                       f"{len(changes['changed'])} changed; saved to {changes_file_path}")
+    return changes
+
+def save_metrics(path, update_status):
+    for line in metrics.summary():
+        update_status.emit(line)
+    metrics.write(path)
+    update_status.emit(f"Metrics saved to {path}")
+
+def scrape(search_city, sedation_check, limit, workers=DEFAULT_WORKERS, backend='http', output_format='xlsx', output_path=None,
+           use_cache=True, incremental=False, resume=False, keep_records=True, sedation_type='', metrics_path=None, controller=None,
+           geocoder=None, index_path=DEFAULT_INDEX_PATH, backend_options=None, on_status=None, on_progress=None):
+    # Run one search end to end and return its records. Records are streamed
+    # to output_path (or dentists_in_[city]_filtered.[format]) as they arrive;
+    # pass output_format=None to only get them back in memory, or
+    # keep_records=False to only write them and get [] back. sedation_type
+    # is the site's SedationType code, which narrows the search on the site.
+    # on_progress gets the percentage done, from the pages scraped so far.
+    # Run metrics go to metrics_path (default dentists_in_[city]_metrics.prom),
+    # as JSON if it ends in .json. Pass a RunController to pause or cancel
+    # the run from another thread, and a geocode.Geocoder to add Latitude
+    # and Longitude to every record. The output file is added to the record
+    # index at index_path for record_index.py queries, None skips it.
+    # backend_options tune the backend, e.g. {'rate': 20, 'concurrency': 16}
+    # for the async one.
+    update_status = Callback(on_status)
+    update_progress = Callback(on_progress)
+    if controller is None:
+        controller = RunController()
+    metrics.reset()
+    url = search_url(search_city, sedation_type)
+    if output_format and output_path is None:
+        output_path = output_file(search_city, output_format)
+
+    cache = PageCache() if use_cache else None
+    store = RecordStore() if incremental else None
+    journal = Journal(journal_path(search_city, sedation_check), resume)
+    columns = COLUMNS + GEO_COLUMNS if geocoder is not None else COLUMNS
+    sink = open_sink(output_path, output_format, columns) if output_path else None
+    try:
+        # Records are only kept in memory when something needs them afterwards
+        dentists = get_dentists(url, limit, search_city, sedation_check, update_status, update_progress, backend, workers,
+                                cache, store, journal, sink, keep_records or incremental or sink is None, controller,
+                                geocoder, backend_options=backend_options)
+    finally:
+        if sink is not None:
+            sink.close()
+        journal.close()
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            store.close()
+
+    # A cancelled run only has part of the results, diffing it would report everything else as removed
+    if incremental and not controller.cancelled:
+        save_changes(search_city, sedation_check, dentists, output_format or 'xlsx', update_status)
+    if output_path and index_path:
+        index_outputs([(output_path, sedation_check)], index_path, update_status)
+    save_metrics(metrics_path or output_file(search_city, 'prom', 'metrics'), update_status)
+    return dentists
@@ -0,0 +1,163 @@
+from parsing import row_fingerprint
+
+# Single-pass DOM extraction for the Selenium backend. Each page type is read
+# by one injected script that returns a JSON payload, instead of dozens of
+# find_element round trips to chromedriver. The payloads match parsing.py,
+# so both backends feed the same scraping loop. Text is read from the DOM's
+# text nodes the way parsing.clean_text reads them, so row fingerprints match
+# pages re-parsed from the cache, and it includes the collapsed "See All
+# Practice Locations" section without having to expand it first.
+
+HELPERS = r"""
+// Same as clean_text(): every text node stripped, joined with spaces, script and style left out
+const clean = node => {
+    if (!node) {
+        return '';
+    }
+    const parts = [];
+    const walker = document.createTreeWalker(node, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        const parent = walker.currentNode.parentNode;
+        if (parent && ['SCRIPT', 'STYLE', 'TEMPLATE'].includes(parent.tagName)) {
+            continue;
+        }
+        const text = walker.currentNode.nodeValue.trim();
+        if (text) {
+            parts.push(text);
+        }
+    }
+    return parts.join(' ').replace(/\s+/g, ' ');
+};
+const href = node => node && node.getAttribute('href') ? node.href : null;
+const definition = (label, exact, root = document) => {
+    for (const dt of root.querySelectorAll('dt')) {
+        const text = dt.textContent.trim();
+        if (exact ? text === label : text.includes(label)) {
+            let node = dt.nextElementSibling;
+            while (node && node.tagName !== 'DD') {
+                node = node.nextElementSibling;
+            }
+            if (node) {
+                return clean(node);
+            }
+        }
+    }
+    return null;
+};
+"""
+
+RESULTS_SCRIPT = HELPERS + r"""
+const rows = [];
+for (const item of document.querySelectorAll('div#dentistSearchResults .row')) {
+    if (!(item.offsetWidth || item.offsetHeight || item.getClientRects().length)) {
+        continue;  // Same as is_displayed()
+    }
+    const link = item.querySelector('h2 a');
+    if (!href(link)) {
+        continue;
+    }
+    rows.push({name: clean(item.querySelector('h2')), detail_url: link.href, text: clean(item),
+               specialty: definition('Specialty:', true, item)});
+}
+
+const pageLinks = {};
+for (const link of document.querySelectorAll('a.page-link')) {
+    const text = link.textContent.trim();
+    if (/^\d+$/.test(text) && href(link)) {
+        pageLinks[text] = link.href;
+    }
+}
+
+// The last page is the link that comes after the ellipsis
+let lastUrl = null;
+for (const span of document.querySelectorAll('span.page-link')) {
+    if (span.textContent.trim() !== '...') {
+        continue;
+    }
+    const item = span.closest('li');
+    const following = item ? item.nextElementSibling : null;
+    lastUrl = href(following ? following.querySelector('a') : null);
+    if (lastUrl) {
+        break;
+    }
+}
+
+return {
+    rows: rows,
+    page_links: pageLinks,
+    next_url: href(document.querySelector('a.page-link.next')),
+    prev_url: href(document.querySelector('a.page-link.prev')),
+    last_url: lastUrl,
+};
+"""
+
+DETAIL_SCRIPT = HELPERS + r"""
+let permitsUrl = null;
+for (const link of document.querySelectorAll('a')) {
+    if (link.textContent.trim() === 'View Facility Permits' && href(link)) {
+        permitsUrl = link.href;
+        break;
+    }
+}
+
+const locations = [];
+for (const location of document.querySelectorAll('div[data-collapsible-toggled] .row')) {
+    const address = location.querySelector('address');
+    if (!address) {
+        continue;
+    }
+    const spans = Array.from(address.querySelectorAll('span'), clean);
+    const businessName = clean(location.querySelector('h6'));
+    if (spans.length >= 3) {
+        locations.push({business_name: businessName, address: spans[0], city_state_zip: spans[1].replace(/,/g, ''), zip_code: spans[2]});
+    } else {
+        locations.push({business_name: businessName, address: '', city_state_zip: '', zip_code: ''});
+    }
+}
+
+return {
+    name: clean(document.querySelector('h1') || document.querySelector('h2')),
+    specialty: definition('Specialty:', true),
+    primary_practice: Array.from(document.querySelectorAll('h3')).some(h3 => h3.textContent.trim() === 'Primary Practice'),
+    permits_url: permitsUrl,
+    locations: locations,
+};
+"""
+
+PERMITS_SCRIPT = HELPERS + r"""
+return {sedation_type: definition('Highest Level Of Sedation', false)};
+"""
+
+
+def extract_results(driver, url):
+    payload = driver.execute_script(RESULTS_SCRIPT)
+    rows = [{
+        'name': row['name'],
+        'detail_url': row['detail_url'],
+        'fingerprint': row_fingerprint(row['text']),
+        'text': row['text'],
+        'specialty': row['specialty'],
+    } for row in payload['rows']]
+    return {
+        'url': url,
+        'rows': rows,
+        'page_links': {int(number): link for number, link in payload['page_links'].items()},
+        'next_url': payload['next_url'],
+        'prev_url': payload['prev_url'],
+        'last_url': payload['last_url'],
+    }
+
+def extract_detail(driver, url):
+    return dict(driver.execute_script(DETAIL_SCRIPT), url=url)
+
+def extract_permits(driver, url):
+    return dict(driver.execute_script(PERMITS_SCRIPT), url=url)
+
+def extract_fixture(driver, path, extract):
+    # Run an extractor against a saved HTML page, e.g. to check it matches
+    # parsing.py: extract_fixture(driver, 'fixtures/detail.html', extract_detail)
+    import pathlib
+
+    url = pathlib.Path(path).resolve().as_uri()
+    driver.get(url)
+    return extract(driver, url)
@@ -0,0 +1,84 @@
+import threading
+
+from records import city_matcher
+
+# Staged dentist filters, cheapest first. Each stage only sees the dentists
+# that passed the ones before it, so detail and permit pages are fetched only
+# for dentists that can still end up in the results:
+#   search   - SedationType/MbrSpecialty in the search URL, applied by the site
+#   row      - a Specialty: label on the results row, free once the results page is loaded
+#   detail   - specialty, Primary Practice and city, before the permits page
+#   permits  - the sedation level on the facility permits page
+# build_records() still applies every check, this only decides what to fetch.
+
+STAGES = ('row', 'specialty', 'primary practice', 'city', 'sedation')
+
+
+def wants_permits(detail):
+    # The search-independent part of the detail checks. Dentists that pass
+    # it have their permits fetched unless a search-specific stage (city)
+    # rules them out, in which case their pages aren't reusable by the
+    # incremental store
+    return detail['specialty'] is None and bool(detail['primary_practice']) and bool(detail['permits_url'])
+
+
+class FilterPipeline:
+    # Shared by every worker of a run. cities and sedations are all the
+    # searches the fetched pages feed, so a dentist is only dropped early when
+    # no search could use it
+    def __init__(self, cities=(), sedations=()):
+        self.matchers = [city_matcher(city) for city in cities if city]
+        self.sedations = [sedation for sedation in sedations if sedation]
+        self.lock = threading.Lock()
+        self.counts = {stage: [0, 0] for stage in STAGES}
+        self.fetches = {'detail': [0, 0.0], 'permits': [0, 0.0]}
+
+    def count(self, stage, passed):
+        with self.lock:
+            self.counts[stage][0] += 1
+            self.counts[stage][1] += bool(passed)
+        return passed
+
+    def fetched(self, kind, seconds):
+        with self.lock:
+            self.fetches[kind][0] += 1
+            self.fetches[kind][1] += seconds
+
+    def check_row(self, row):
+        # Only the structured label counts: free text like a practice called
+        # "... Dental Specialists" says nothing about the dentist
+        return self.count('row', row.get('specialty') is None)
+
+    def matches_city(self, detail):
+        if not self.matchers:
+            return True
+        # Locations without an address still make a record with a blank city
+        return any(not location['city_state_zip'] or any(matches(location['city_state_zip']) for matches in self.matchers)
+                   for location in detail['locations'])
+
+    def needs_permits(self, detail):
+        # Run the detail stages in order and stop at the first one that fails
+        if not self.count('specialty', detail['specialty'] is None):
+            return False
+        if not self.count('primary practice', detail['primary_practice']):
+            return False
+        if not self.count('city', self.matches_city(detail)):
+            return False
+        return bool(detail['permits_url'])
+
+    def check_permits(self, permits):
+        sedation_type = permits['sedation_type']
+        passed = sedation_type is not None and (not self.sedations or any(sedation in sedation_type for sedation in self.sedations))
+        return self.count('sedation', passed)
+
+    def summary(self):
+        with self.lock:
+            stages = []
+            for stage in STAGES:
+                seen, passed = self.counts[stage]
+                if seen:
+                    stages.append(f"{stage} {seen} -> {passed} ({passed / seen:.0%})")
+            fetches = [f"{count} {kind} pages ({seconds:.1f}s of fetch time)" for kind, (count, seconds) in self.fetches.items() if count]
+        if not stages:
+            return "Filter stages: no dentists checked."
+        return "Filter stages: " + ", ".join(stages) + ("; fetched " + ", ".join(fetches) if fetches else "")
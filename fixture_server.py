@@ -0,0 +1,95 @@
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local HTTP server that replays saved pages. Pages are stored by a hash of
+# their path and query string, so any URL the scraper builds can be replayed:
+#   python fixture_server.py fixtures/ 8000 [latency] [jitter] [error_rate]
+# then point the scraper at http://127.0.0.1:8000/find-a-dentist/search-results?...
+# Latency and jitter are in seconds; error_rate is the share of requests
+# answered with a 429 or 503 to exercise retries and backoff.
+
+
+def fixture_name(path):
+    return hashlib.sha1(path.encode('utf-8')).hexdigest() + '.html'
+
+def save_fixture(directory, path, html):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, fixture_name(path)), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    directory = 'fixtures'
+    latency = 0
+    jitter = 0
+    error_rate = 0
+
+    def do_GET(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            status = random.choice((429, 503))
+            self.send_response(status)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        file_path = os.path.join(self.directory, fixture_name(self.path))
+        if not os.path.exists(file_path):
+            self.send_error(404, f"No fixture for {self.path}")
+            return
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+
+        # Support conditional requests so cache revalidation can be exercised
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_fixture_server(directory, port=0, latency=0, jitter=0, error_rate=0):
+    handler = type('Handler', (FixtureHandler,), {
+        'directory': directory, 'latency': latency, 'jitter': jitter, 'error_rate': error_rate,
+    })
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+def start_fixture_server(directory, port=0, latency=0, jitter=0, error_rate=0):
+    # Serve in a background thread, returns the server and its base address
+    server = make_fixture_server(directory, port, latency, jitter, error_rate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'fixtures'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    jitter = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+    error_rate = float(sys.argv[5]) if len(sys.argv) > 5 else 0
+    server = make_fixture_server(directory, port, latency, jitter, error_rate)
+    print(f"Serving fixtures from {directory} at http://127.0.0.1:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,265 @@
+import csv
+import math
+import sqlite3
+import sys
+import threading
+
+from records import normalize_address, normalize_postal_code, read_records
+
+# Optional geocoding of exported locations. Records get Latitude/Longitude
+# from a local provider, so nothing leaves the machine and weekly runs don't
+# need a geocoding service. Lookups are memoized in a SQLite file shared by
+# every run. SpatialIndex answers nearest and radius queries over the
+# results for routing:
+#   python geocode.py dentists_in_Etobicoke_filtered.csv --near 43.64 -79.56 --radius 5
+
+DEFAULT_GEOCODE_PATH = 'geocode.sqlite3'
+GEO_COLUMNS = ['Latitude', 'Longitude']
+EARTH_RADIUS_KM = 6371.0088
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    provider TEXT NOT NULL,
+    key TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    PRIMARY KEY (provider, key)
+);
+"""
+
+
+class CentroidProvider:
+    # Postal code centroids from a CSV with postal_code, latitude and
+    # longitude columns (e.g. a GeoNames or Statistics Canada extract).
+    # Codes missing from the table fall back to the centroid of their
+    # forward sortation area, the first three characters.
+    name = 'centroids'
+
+    def __init__(self, path):
+        self.path = path
+        self.centroids = {}
+        areas = {}
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                row = {key.strip().lower(): value for key, value in row.items() if key}
+                postal_code = normalize_postal_code(row.get('postal_code'))
+                try:
+                    point = (float(row['latitude']), float(row['longitude']))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if postal_code:
+                    self.centroids[postal_code] = point
+                    areas.setdefault(postal_code[:3], []).append(point)
+                elif len(row.get('postal_code', '').strip()) == 3:
+                    areas.setdefault(row['postal_code'].strip().upper(), []).append(point)
+        self.areas = {area: (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+                      for area, points in areas.items()}
+
+    def key(self, address, postal_code):
+        # Centroids only depend on the postal code, so every practice sharing one shares a cache entry
+        return postal_code
+
+    def geocode(self, address, postal_code):
+        return self.centroids.get(postal_code) or self.areas.get(postal_code[:3])
+
+
+class GeocodeCache:
+    def __init__(self, path=DEFAULT_GEOCODE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.memo = {}
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def get(self, provider, key):
+        # Returns (found, point); misses are cached too, as a None point
+        with self.lock:
+            if (provider, key) in self.memo:
+                return True, self.memo[(provider, key)]
+            row = self.connection.execute('SELECT latitude, longitude FROM geocodes WHERE provider = ? AND key = ?',
+                                          (provider, key)).fetchone()
+            if row is None:
+                return False, None
+            point = (row[0], row[1]) if row[0] is not None else None
+            self.memo[(provider, key)] = point
+            return True, point
+
+    def put(self, provider, key, point):
+        with self.lock:
+            self.memo[(provider, key)] = point
+            self.connection.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)',
+                                    (provider, key, *(point if point is not None else (None, None))))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class Geocoder:
+    def __init__(self, provider, cache=None):
+        self.provider = provider
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.stats = {'geocoded': 0, 'cached': 0, 'missed': 0}
+
+    def locate(self, record):
+        address = normalize_address(record.get('Address'))
+        postal_code = normalize_postal_code(record.get('City'))
+        key = self.provider.key(address, postal_code)
+        if not key:
+            return None
+
+        found, point = self.cache.get(self.provider.name, key) if self.cache is not None else (False, None)
+        if not found:
+            point = self.provider.geocode(address, postal_code)
+            if self.cache is not None:
+                self.cache.put(self.provider.name, key, point)
+        with self.lock:
+            self.stats['cached' if found else 'geocoded'] += 1
+            if point is None:
+                self.stats['missed'] += 1
+        return point
+
+    def enrich(self, records):
+        # Adds Latitude/Longitude in place, blank when the location can't be placed
+        for record in records:
+            point = self.locate(record)
+            record['Latitude'], record['Longitude'] = (round(point[0], 6), round(point[1], 6)) if point else ('', '')
+        return records
+
+    def summary(self):
+        with self.lock:
+            return (f"Geocoding: {self.stats['geocoded']} looked up, {self.stats['cached']} from cache, "
+                    f"{self.stats['missed']} not found")
+
+
+def to_unit_vector(latitude, longitude):
+    # Points on the unit sphere: straight-line distance grows with great-circle
+    # distance, so a plain KD-tree over them answers geographic queries
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+def chord(distance_km):
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+def arc_km(chord_length):
+    return 2 * math.asin(min(chord_length / 2, 1.0)) * EARTH_RADIUS_KM
+
+
+class SpatialIndex:
+    # KD-tree over 3D unit vectors, stored as flat lists. Each node is the
+    # median point of its range along the split axis; the ranges on either
+    # side are its subtrees.
+    def __init__(self, items):
+        # items: (latitude, longitude, payload)
+        self.items = [item for item in items if item[0] is not None and item[1] is not None]
+        points = [(to_unit_vector(item[0], item[1]), index) for index, item in enumerate(self.items)]
+        self.points = self.build(points)
+
+    @staticmethod
+    def build(points):
+        layout = [None] * len(points)
+        ranges = [(0, len(points), points, 0)]
+        while ranges:
+            start, end, subset, depth = ranges.pop()
+            if not subset:
+                continue
+            axis = depth % 3
+            subset.sort(key=lambda point: point[0][axis])
+            middle = len(subset) // 2
+            layout[start + middle] = subset[middle]
+            ranges.append((start, start + middle, subset[:middle], depth + 1))
+            ranges.append((start + middle + 1, end, subset[middle + 1:], depth + 1))
+        return layout
+
+    def __len__(self):
+        return len(self.points)
+
+    def search(self, target, radius, best):
+        # Visit nodes nearest-first and skip any subtree whose splitting plane
+        # is further away than the current radius. best collects
+        # (distance, index); radius() returns the current cut-off
+        stack = [(0, len(self.points), 0)]
+        while stack:
+            start, end, depth = stack.pop()
+            if start >= end:
+                continue
+            middle = (start + end) // 2
+            vector, index = self.points[middle]
+            distance = math.dist(vector, target)
+            if distance <= radius():
+                best(distance, index)
+
+            axis = depth % 3
+            offset = target[axis] - vector[axis]
+            near, far = ((middle + 1, end), (start, middle)) if offset > 0 else ((start, middle), (middle + 1, end))
+            # The far side is pushed first so the near side is searched first
+            if abs(offset) <= radius():
+                stack.append((*far, depth + 1))
+            stack.append((*near, depth + 1))
+
+    def within(self, latitude, longitude, radius_km):
+        # Every item within radius_km, nearest first, as (distance_km, item)
+        target = to_unit_vector(latitude, longitude)
+        limit = chord(radius_km)
+        found = []
+        self.search(target, lambda: limit, lambda distance, index: found.append((distance, index)))
+        return [(arc_km(distance), self.items[index]) for distance, index in sorted(found)]
+
+    def nearest(self, latitude, longitude, count=1):
+        # The count nearest items as (distance_km, item)
+        target = to_unit_vector(latitude, longitude)
+        found = []
+
+        def radius():
+            return found[-1][0] if len(found) >= count else math.inf
+
+        def keep(distance, index):
+            found.append((distance, index))
+            found.sort()
+            del found[count:]
+
+        self.search(target, radius, keep)
+        return [(arc_km(distance), self.items[index]) for distance, index in found]
+
+
+def records_index(records):
+    # Index exported records by their Latitude/Longitude columns
+    items = []
+    for record in records:
+        try:
+            items.append((float(record['Latitude']), float(record['Longitude']), record))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return SpatialIndex(items)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Nearest and radius queries over geocoded exports.")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--near', nargs=2, type=float, required=True, metavar=('LAT', 'LON'))
+    parser.add_argument('--radius', type=float, help="Every practice within this many km")
+    parser.add_argument('--count', type=int, default=10, help="Otherwise the nearest COUNT practices (default 10)")
+    args = parser.parse_args()
+
+    records = [record for path in args.files for record in read_records(path)]
+    started = time.perf_counter()
+    index = records_index(records)
+    built = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if args.radius is not None:
+        matches = index.within(*args.near, args.radius)
+    else:
+        matches = index.nearest(*args.near, args.count)
+    queried = time.perf_counter() - started
+
+    for distance, (_, _, record) in matches:
+        print(f"{distance:7.2f} km  {record.get('Name', '')}, {record.get('Business Name', '')}, "
+              f"{record.get('Address', '')}, {record.get('City', '')}")
+    print(f"{len(matches)} of {len(index)} geocoded practices; index built in {built * 1000:.0f} ms, "
+          f"queried in {queried * 1000:.1f} ms", file=sys.stderr)
@@ -0,0 +1,158 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer
+from PyQt5.QtGui import QColor
+
+# Status log for the GUI. Workers append messages to a thread-safe buffer
+# instead of emitting one Qt signal per message. A timer drains the buffer at
+# a fixed frame rate into a ring-buffered list model, so the view only ever
+# holds the newest LOG_CAPACITY lines, and every line goes to a rotating log
+# file in full.
+
+LOG_CAPACITY = 5000
+FRAME_INTERVAL_MS = 33  # About 30 updates a second
+LOG_FILE = 'scraper.log'
+LOG_FILE_BYTES = 5 * 2 ** 20
+LOG_FILE_BACKUPS = 3
+
+COLORS = {
+    'info': QColor('#e0e0e0'),
+    'error': QColor('#ff5555'),
+    'success': QColor('#00ff00'),
+}
+
+
+def message_level(message):
+    # Engine messages are plain text, errors are recognised by their wording
+    return 'error' if 'Error' in message or 'stopped:' in message else 'info'
+
+
+class LogFile:
+    # Writes whole frames of lines to a rotating file on a background thread,
+    # so disk I/O never holds up the event loop
+    def __init__(self, path=LOG_FILE):
+        self.handler = RotatingFileHandler(path, maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+        self.handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, lines):
+        self.queue.put((time.time(), lines))
+
+    def close(self):
+        # Let the writer finish what is queued
+        self.queue.put(None)
+        self.thread.join()
+        self.handler.close()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            created, lines = item
+            for message, level in lines:
+                levelno = logging.ERROR if level == 'error' else logging.INFO
+                self.handler.handle(logging.makeLogRecord({
+                    'name': 'rcdso.status', 'msg': message, 'levelno': levelno,
+                    'levelname': logging.getLevelName(levelno), 'created': created,
+                }))
+
+
+class LogBuffer:
+    # Collects messages from any thread until the next frame
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def append(self, message, level=None):
+        with self.lock:
+            self.pending.append((message, level or message_level(message)))
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+
+class LogModel(QAbstractListModel):
+    def __init__(self, capacity=LOG_CAPACITY, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.lines = deque(maxlen=capacity)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message, level = self.lines[index.row()]
+        if role == Qt.DisplayRole:
+            return message
+        if role == Qt.ForegroundRole:
+            return COLORS[level]
+        return None
+
+    def extend(self, lines):
+        # Add a frame's worth of lines, dropping the oldest ones past the cap
+        lines = lines[-self.capacity:]
+        if not lines:
+            return
+        overflow = len(self.lines) + len(lines) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.lines.popleft()
+            self.endRemoveRows()
+        first = len(self.lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(lines) - 1)
+        self.lines.extend(lines)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.lines.clear()
+        self.endResetModel()
+
+
+class StatusLog:
+    # Ties the buffer, model, log file and frame timer to a QListView
+    def __init__(self, view, capacity=LOG_CAPACITY, path=LOG_FILE, interval=FRAME_INTERVAL_MS):
+        self.view = view
+        self.buffer = LogBuffer()
+        self.model = LogModel(capacity, view)
+        self.file = LogFile(path)
+        view.setModel(self.model)
+        view.setUniformItemSizes(True)  # Lets the view skip measuring every row
+
+        self.timer = QTimer(view)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start(interval)
+
+    def append(self, message, level=None):
+        self.buffer.append(message, level)
+
+    def flush(self):
+        lines = self.buffer.drain()
+        if not lines:
+            return
+        self.file.write(lines)
+
+        # Keep following the newest line unless the user scrolled up
+        scrollbar = self.view.verticalScrollBar()
+        following = scrollbar.value() == scrollbar.maximum()
+        self.model.extend(lines)
+        if following:
+            self.view.scrollToBottom()
+
+    def close(self):
+        self.timer.stop()
+        self.flush()
+        self.file.close()
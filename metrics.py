@@ -0,0 +1,123 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Run instrumentation. Workers record timing spans (driver startup, page
+# loads, waits, dentist fetches, extraction, export) and counters (pages,
+# dentists, skips by reason, retries, errors) into the shared registry below.
+# At the end of a run it is written as Prometheus text, or as JSON when the
+# file name ends in .json.
+
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = 'rcdso'
+
+
+def quantile(samples, q):
+    # Nearest-rank quantile of sorted samples
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Span:
+    seconds = 0.0
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Called at the start of every run
+        with self.lock:
+            self.samples = {}
+            self.counters = {}
+            self.started = time.time()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.samples.setdefault(key, []).append(seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        # Times the block, failed attempts included
+        span = Span()
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - started
+            self.observe(name, span.seconds, **labels)
+
+    def incr(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def count(self, name, **labels):
+        with self.lock:
+            return sum(value for (counter, counter_labels), value in self.counters.items()
+                       if counter == name and all(item in counter_labels for item in labels.items()))
+
+    def snapshot(self):
+        with self.lock:
+            spans = []
+            for (name, labels), samples in sorted(self.samples.items()):
+                samples = sorted(samples)
+                span = {'name': name, 'labels': dict(labels), 'count': len(samples), 'sum': sum(samples)}
+                span.update({f"p{int(q * 100)}": quantile(samples, q) for q in QUANTILES})
+                spans.append(span)
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            return {'started': self.started, 'duration': time.time() - self.started, 'spans': spans, 'counters': counters}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {PREFIX}_run_duration_seconds gauge", f"{PREFIX}_run_duration_seconds {snapshot['duration']:.6f}"]
+
+        seen = set()
+        for span in snapshot['spans']:
+            metric = f"{PREFIX}_{span['name']}_seconds"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f"{metric}{format_labels(span['labels'], quantile=q)} {span[f'p{int(q * 100)}']:.6f}")
+            lines.append(f"{metric}_sum{format_labels(span['labels'])} {span['sum']:.6f}")
+            lines.append(f"{metric}_count{format_labels(span['labels'])} {span['count']}")
+
+        for counter in snapshot['counters']:
+            metric = f"{PREFIX}_{counter['name']}_total"
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{format_labels(counter['labels'])} {counter['value']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.prometheus())
+
+    def summary(self):
+        # One line per span for the status log
+        lines = []
+        for span in self.snapshot()['spans']:
+            labels = ' '.join(f"{value}" for value in span['labels'].values())
+            lines.append(f"{span['name']}{' ' + labels if labels else ''}: {span['count']} in {span['sum']:.1f}s, "
+                         f"p50 {span['p50'] * 1000:.0f}ms, p95 {span['p95'] * 1000:.0f}ms, p99 {span['p99'] * 1000:.0f}ms")
+        return lines
+
+
+# Shared by every worker and backend of the current run
+metrics = Metrics()
@@ -0,0 +1,155 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Persistent page cache in a local SQLite file. Page bodies are stored once
+# per content hash and looked up by URL, each page type has its own TTL, and
+# the least recently used pages are evicted once the cache outgrows its size
+# bound. Stale pages keep their ETag/Last-Modified so the HTTP backend can
+# revalidate them instead of downloading them again.
+
+DEFAULT_CACHE_PATH = 'page_cache.sqlite3'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+EVICT_TO = 0.9  # Eviction frees some headroom so a full cache isn't swept on every store
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Search results move as dentists register; detail and permit pages rarely change
+DEFAULT_TTLS = {
+    'results': 6 * HOUR,
+    'detail': 7 * DAY,
+    'permits': 7 * DAY,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES bodies(hash),
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed_at);
+CREATE INDEX IF NOT EXISTS pages_hash ON pages(hash);
+-- Sizes apart from the bodies, so totalling them doesn't read every body
+CREATE TABLE IF NOT EXISTS body_sizes (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+"""
+
+
+def content_hash(body):
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        # Caches written before body_sizes existed get their sizes copied over once
+        self.connection.execute('INSERT INTO body_sizes (hash, size) SELECT hash, size FROM bodies '
+                                'WHERE hash NOT IN (SELECT hash FROM body_sizes)')
+        self.connection.commit()
+        self.total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM body_sizes').fetchone()[0]
+
+    def get(self, url, kind):
+        # Returns the cached entry with a 'fresh' flag, or None on a miss
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT bodies.body, pages.etag, pages.last_modified, pages.fetched_at '
+                'FROM pages JOIN bodies ON bodies.hash = pages.hash WHERE pages.url = ?', (url,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            body, etag, last_modified, fetched_at = row
+            fresh = now - fetched_at < self.ttls.get(kind, 0)
+            self.stats['hits' if fresh else 'stale'] += 1
+            self.connection.execute('UPDATE pages SET accessed_at = ? WHERE url = ?', (now, url))
+            self.connection.commit()
+
+        return {'body': body, 'etag': etag, 'last_modified': last_modified, 'fresh': fresh}
+
+    def put(self, url, kind, body, etag=None, last_modified=None):
+        now = time.time()
+        digest = content_hash(body)
+        size = len(body.encode('utf-8'))
+        with self.lock:
+            previous = self.connection.execute('SELECT hash FROM pages WHERE url = ?', (url,)).fetchone()
+            if self.connection.execute('INSERT OR IGNORE INTO bodies (hash, body, size) VALUES (?, ?, ?)',
+                                       (digest, body, size)).rowcount:
+                self.connection.execute('INSERT INTO body_sizes (hash, size) VALUES (?, ?)', (digest, size))
+                self.total += size
+            self.connection.execute(
+                'INSERT OR REPLACE INTO pages (url, kind, hash, etag, last_modified, fetched_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (url, kind, digest, etag, last_modified, now, now))
+            # The page's old body goes as soon as nothing else refers to it
+            if previous is not None and previous[0] != digest:
+                self.release(previous[0])
+            self.stats['stored'] += 1
+            if self.total > self.max_bytes:
+                self.evict()
+            self.connection.commit()
+
+    def refresh(self, url):
+        # The server answered 304 Not Modified, so the cached body is fresh again
+        now = time.time()
+        with self.lock:
+            self.connection.execute('UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            self.connection.commit()
+            self.stats['revalidated'] += 1
+
+    def release(self, digest):
+        # Called with the lock held. Deletes a body no page refers to any more
+        if self.connection.execute('SELECT 1 FROM pages WHERE hash = ? LIMIT 1', (digest,)).fetchone() is not None:
+            return
+        row = self.connection.execute('SELECT size FROM body_sizes WHERE hash = ?', (digest,)).fetchone()
+        self.connection.execute('DELETE FROM bodies WHERE hash = ?', (digest,))
+        self.connection.execute('DELETE FROM body_sizes WHERE hash = ?', (digest,))
+        if row is not None:
+            self.total -= row[0]
+
+    def evict(self):
+        # Called with the lock held once the bodies outgrow max_bytes. Drops
+        # least recently used pages until they're back under EVICT_TO of it
+        target = self.max_bytes * EVICT_TO
+        # Orphans left by caches written before bodies were released with their pages
+        for (digest,) in self.connection.execute('SELECT hash FROM body_sizes WHERE hash NOT IN (SELECT hash FROM pages)').fetchall():
+            self.release(digest)
+
+        rows = self.connection.execute('SELECT url, hash FROM pages ORDER BY accessed_at').fetchall()
+        for url, digest in rows:
+            if self.total <= target:
+                break
+            self.connection.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self.release(digest)
+            self.stats['evicted'] += 1
+
+    def summary(self):
+        stats = self.stats
+        lookups = stats['hits'] + stats['stale'] + stats['misses']
+        hit_rate = (stats['hits'] + stats['revalidated']) / lookups if lookups else 0
+        return (f"Page cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['stale'] - stats['revalidated']} refetched, "
+                f"{stats['misses']} misses ({hit_rate:.0%} served from cache), {stats['evicted']} evicted")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,175 @@
+import hashlib
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from bs4 import BeautifulSoup
+
+# Static HTML parsing for the RCDSO pages. These read the same selectors the
+# Selenium code uses so both backends produce identical records.
+
+RESULTS_ROW_SELECTOR = 'div#dentistSearchResults .row'
+LOCATION_ROW_SELECTOR = 'div[data-collapsible-toggled] .row'
+
+
+def make_soup(html):
+    return BeautifulSoup(html, 'html.parser')
+
+def clean_text(node):
+    if node is None:
+        return ''
+    return ' '.join(node.get_text(' ', strip=True).split())
+
+def row_fingerprint(text):
+    # Hash of a results row's visible text, used to spot dentists whose
+    # listing changed since the last run
+    return hashlib.sha1(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+def dentist_id(detail_url):
+    # Stable identifier for a dentist: the detail page path and its query
+    # parameters in a fixed order
+    parts = urlsplit(detail_url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{parts.path}?{query}" if query else parts.path
+
+def is_hidden(node):
+    # Static equivalent of is_displayed(): skip rows hidden with markup
+    while node is not None and getattr(node, 'name', None):
+        if node.has_attr('hidden'):
+            return True
+        style = node.get('style', '').replace(' ', '').lower()
+        if 'display:none' in style:
+            return True
+        node = node.parent
+    return False
+
+def definition_value(soup, label, exact=True):
+    # Return the <dd> text that follows a <dt> with the given label
+    for dt in soup.find_all('dt'):
+        text = dt.get_text(strip=True)
+        if (text == label) if exact else (label in text):
+            dd = dt.find_next_sibling('dd')
+            if dd is not None:
+                return clean_text(dd)
+    return None
+
+def parse_pagination(soup, page_url):
+    pagination = {'next_url': None, 'prev_url': None, 'last_url': None, 'page_links': {}}
+
+    # Numbered page links, used to work out the page count and page URLs
+    for link in soup.select('a.page-link'):
+        text = link.get_text(strip=True)
+        if text.isdigit() and link.get('href'):
+            pagination['page_links'][int(text)] = urljoin(page_url, link['href'])
+
+    next_link = soup.select_one('a.page-link.next')
+    if next_link is not None and next_link.get('href'):
+        pagination['next_url'] = urljoin(page_url, next_link['href'])
+
+    prev_link = soup.select_one('a.page-link.prev')
+    if prev_link is not None and prev_link.get('href'):
+        pagination['prev_url'] = urljoin(page_url, prev_link['href'])
+
+    # The last page is the link that comes after the ellipsis
+    for span in soup.select('span.page-link'):
+        if span.get_text(strip=True) != '...':
+            continue
+        li = span.find_parent('li')
+        following = li.find_next_sibling('li') if li is not None else None
+        link = following.find('a') if following is not None else None
+        if link is not None and link.get('href'):
+            pagination['last_url'] = urljoin(page_url, link['href'])
+            break
+
+    return pagination
+
+def parse_results(html, page_url):
+    soup = make_soup(html)
+    rows = []
+    for item in soup.select(RESULTS_ROW_SELECTOR):
+        if is_hidden(item):
+            continue
+        heading = item.find('h2')
+        link = heading.find('a') if heading is not None else None
+        if link is None or not link.get('href'):
+            continue
+        text = clean_text(item)
+        rows.append({
+            'name': clean_text(heading),
+            'detail_url': urljoin(page_url, link['href']),
+            'fingerprint': row_fingerprint(text),
+            'text': text,
+            'specialty': definition_value(item, 'Specialty:'),
+        })
+
+    page = {'url': page_url, 'rows': rows}
+    page.update(parse_pagination(soup, page_url))
+    return page
+
+def parse_location(location):
+    heading = location.find('h6')
+    business_name = clean_text(heading)
+
+    address_tag = location.find('address')
+    if address_tag is None:
+        return None
+
+    spans = [clean_text(span) for span in address_tag.find_all('span')]
+    if len(spans) >= 3:
+        return {
+            'business_name': business_name,
+            'address': spans[0],
+            'city_state_zip': spans[1].replace(',', ''),
+            'zip_code': spans[2],
+        }
+    return {'business_name': business_name, 'address': '', 'city_state_zip': '', 'zip_code': ''}
+
+def parse_detail(html, page_url):
+    soup = make_soup(html)
+
+    heading = soup.find('h1') or soup.find('h2')
+    primary_practice = any(h3.get_text(strip=True) == 'Primary Practice' for h3 in soup.find_all('h3'))
+
+    permits_url = None
+    for link in soup.find_all('a'):
+        if link.get_text(strip=True) == 'View Facility Permits' and link.get('href'):
+            permits_url = urljoin(page_url, link['href'])
+            break
+
+    locations = []
+    for location in soup.select(LOCATION_ROW_SELECTOR):
+        parsed = parse_location(location)
+        if parsed is not None:
+            locations.append(parsed)
+
+    return {
+        'url': page_url,
+        'name': clean_text(heading),
+        'specialty': definition_value(soup, 'Specialty:'),
+        'primary_practice': primary_practice,
+        'permits_url': permits_url,
+        'locations': locations,
+    }
+
+def parse_permits(html, page_url):
+    soup = make_soup(html)
+    return {
+        'url': page_url,
+        'sedation_type': definition_value(soup, 'Highest Level Of Sedation', exact=False),
+    }
+
+def page_count(page):
+    return max(page['page_links'], default=1)
+
+def page_url(page, number):
+    # Build the URL of any results page from the query parameter the
+    # numbered page links use
+    if number in page['page_links']:
+        return page['page_links'][number]
+
+    for known, link in page['page_links'].items():
+        parts = urlsplit(link)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        keys = [key for key, value in query if value == str(known)]
+        if keys:
+            query = [(key, str(number) if key == keys[0] else value) for key, value in query]
+            return urlunsplit(parts._replace(query=urlencode(query)))
+    return None
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from records import normalize_name, normalize_text, normalize_postal_code, read_records, record_key
+
+# Queryable index over every run's output. Exports are loaded into a local
+# SQLite file with indexed city, postal prefix, sedation and business name
+# columns plus a full-text index over names and addresses, so questions like
+# "oral moderate sedation dentists in Brampton under L6X" are answered without
+# opening spreadsheets or scraping again:
+#   python record_index.py load individual/*.xlsx
+#   python record_index.py query --city Brampton --postal L6X --sedation "oral moderate"
+#   python record_index.py serve --port 8765   (GET /records?city=Brampton&postal=L6X)
+# Files are reloaded only when they change, and each run of the scraper adds
+# its own output as it finishes.
+
+DEFAULT_INDEX_PATH = 'records.sqlite3'
+FIELDS = ['Name', 'Business Name', 'Address', 'City', 'Sedation', 'Latitude', 'Longitude', 'Source', 'Loaded']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    loaded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    name TEXT, business_name TEXT, address TEXT, city_text TEXT,
+    city TEXT, postal_prefix TEXT, sedation TEXT, business TEXT,
+    latitude REAL, longitude REAL
+);
+CREATE INDEX IF NOT EXISTS records_city ON records(city);
+CREATE INDEX IF NOT EXISTS records_postal ON records(postal_prefix);
+CREATE INDEX IF NOT EXISTS records_sedation ON records(sedation);
+CREATE INDEX IF NOT EXISTS records_business ON records(business);
+CREATE INDEX IF NOT EXISTS records_file ON records(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    name, business_name, address, content='records', content_rowid='id'
+);
+"""
+
+# Sedation filters that were written into batch output file names
+SEDATION_SUFFIX = re.compile(r'^dentists_in_.+?_(.+)_filtered$')
+
+
+def split_city(value):
+    # "Brampton ON L6X 1A0" -> ("brampton", "L6X 1A0"); older exports only have the city
+    postal_code = normalize_postal_code(value)
+    city = str(value or '')
+    if postal_code:
+        city = re.sub(r'[A-Z]\d[A-Z]\s*\d[A-Z]\d', '', city.upper())
+    city = re.sub(r'\s+ON\s*$', '', normalize_text(city).upper())
+    return normalize_text(city), postal_code
+
+def sedation_from_path(path):
+    match = SEDATION_SUFFIX.match(os.path.splitext(os.path.basename(path))[0])
+    return match.group(1).replace('_', ' ') if match else ''
+
+def float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def prefix_range(column, value):
+    # A prefix match the column's index can serve
+    return f"{column} >= ? AND {column} < ?", [value, value + '\uffff']
+
+
+class RecordIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH, readonly=False):
+        self.path = path
+        self.lock = threading.Lock()
+        if readonly:
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA foreign_keys=ON')
+            self.connection.executescript(SCHEMA)
+
+    def load(self, path, sedation=None):
+        # Returns the number of records loaded, 0 when the file is unchanged.
+        # sedation applies to files without a Sedation column; by default it
+        # comes from the file name of batch outputs
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.connection.execute('SELECT mtime, size FROM files WHERE path = ?', (path,)).fetchone()
+            if row is not None and row == (stat.st_mtime, stat.st_size):
+                return 0
+
+        records = read_records(path)
+        sedation = normalize_text(sedation if sedation is not None else sedation_from_path(path))
+        rows = []
+        for record in records:
+            city, postal_code = split_city(record.get('City'))
+            rows.append((
+                # Older exports have no postal code, so it is left out of the key
+                '|'.join(record_key(record)[:3]),
+                record.get('Name', ''), record.get('Business Name', ''), record.get('Address', ''), record.get('City', ''),
+                city, postal_code[:3], normalize_text(record.get('Sedation')) or sedation,
+                normalize_name(record.get('Business Name')),
+                float_or_none(record.get('Latitude')), float_or_none(record.get('Longitude')),
+            ))
+
+        with self.lock, self.connection:
+            self.remove_locked(path)
+            cursor = self.connection.execute('INSERT INTO files (path, mtime, size, loaded_at) VALUES (?, ?, ?, ?)',
+                                             (path, stat.st_mtime, stat.st_size, time.time()))
+            file_id = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO records (file_id, key, name, business_name, address, city_text, city, postal_prefix, sedation, '
+                'business, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(file_id, *row) for row in rows])
+            self.connection.execute('INSERT INTO records_fts (rowid, name, business_name, address) '
+                                    'SELECT id, name, business_name, address FROM records WHERE file_id = ?', (file_id,))
+        return len(rows)
+
+    def remove_locked(self, path):
+        row = self.connection.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return
+        # External-content FTS rows have to be deleted with their old values
+        self.connection.execute("INSERT INTO records_fts (records_fts, rowid, name, business_name, address) "
+                                "SELECT 'delete', id, name, business_name, address FROM records WHERE file_id = ?", row)
+        self.connection.execute('DELETE FROM records WHERE file_id = ?', row)
+        self.connection.execute('DELETE FROM files WHERE id = ?', row)
+
+    def query(self, city=None, postal=None, sedation=None, business=None, text=None, history=False, limit=100):
+        # Every filter is optional. city, sedation and business match by
+        # prefix, postal by its first three characters, text is a full-text
+        # query over names and addresses. Practices found by several runs
+        # are returned once, from the newest file, unless history is set
+        conditions, params = [], []
+        if city:
+            condition, values = prefix_range('r.city', normalize_text(city))
+            conditions.append(condition)
+            params.extend(values)
+        if postal:
+            conditions.append('r.postal_prefix = ?')
+            params.append(normalize_text(postal).upper().replace(' ', '')[:3])
+        if sedation:
+            condition, values = prefix_range('r.sedation', normalize_text(sedation))
+            conditions.append(condition)
+            params.extend(values)
+        if business:
+            condition, values = prefix_range('r.business', normalize_name(business))
+            conditions.append(condition)
+            params.extend(values)
+        if text:
+            conditions.append('r.id IN (SELECT rowid FROM records_fts WHERE records_fts MATCH ?)')
+            params.append(text)
+
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        columns = ('r.name, r.business_name, r.address, r.city_text, r.sedation, r.latitude, r.longitude, '
+                   'f.path, f.loaded_at')
+        if history:
+            sql = f"SELECT {columns} FROM records r JOIN files f ON f.id = r.file_id{where} ORDER BY r.name, f.loaded_at DESC LIMIT ?"
+        else:
+            # max() makes SQLite return the other columns from the newest row of each group
+            sql = (f"SELECT {columns}, max(f.loaded_at) FROM records r JOIN files f ON f.id = r.file_id{where} "
+                   f"GROUP BY r.key, r.sedation ORDER BY r.name LIMIT ?")
+        params.append(limit)
+
+        with self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        return [dict(zip(FIELDS, row[:len(FIELDS)])) for row in rows]
+
+    def summary(self):
+        with self.lock:
+            files, records = self.connection.execute(
+                'SELECT (SELECT count(*) FROM files), (SELECT count(*) FROM records)').fetchone()
+        return f"Record index: {records} records from {files} files in {self.path}"
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+    # Read-only JSON endpoint: GET /records?city=&postal=&sedation=&business=&q=&limit=&history=1
+    index = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path != '/records':
+            self.send_error(404, "Try /records?city=Brampton")
+            return
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        try:
+            limit = min(int(params.get('limit', 100)), 10000)
+            records = self.index.query(params.get('city'), params.get('postal'), params.get('sedation'), params.get('business'),
+                                       params.get('q'), params.get('history') in ('1', 'true'), limit)
+        except (ValueError, sqlite3.Error) as e:
+            self.send_error(400, str(e))
+            return
+
+        body = json.dumps(records).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_index_server(path=DEFAULT_INDEX_PATH, port=8765):
+    # Bound to localhost, with the database opened read-only
+    handler = type('Handler', (IndexHandler,), {'index': RecordIndex(path, readonly=True)})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+def index_outputs(outputs, path, update_status):
+    # Add the files a run just wrote, as (path, sedation) pairs. The run's
+    # output is already saved, so a failure here is only reported
+    try:
+        index = RecordIndex(path)
+        try:
+            loaded = sum(index.load(output, sedation) for output, sedation in outputs if os.path.exists(output))
+            update_status.emit(f"Indexed {loaded} records. " + index.summary())
+        finally:
+            index.close()
+    except Exception as e:
+        update_status.emit(f"Error indexing the output: {e}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='record_index.py', description="Query every scraper run's output.")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help=f"Index file (default {DEFAULT_INDEX_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = commands.add_parser('load', help="Add export files to the index")
+    load_parser.add_argument('files', nargs='+')
+    load_parser.add_argument('--sedation', help="Sedation level of files without a Sedation column")
+
+    query_parser = commands.add_parser('query', help="Look records up")
+    query_parser.add_argument('--city')
+    query_parser.add_argument('--postal', help="Postal code or its first three characters, e.g. L6X")
+    query_parser.add_argument('--sedation')
+    query_parser.add_argument('--business', help="Business name prefix")
+    query_parser.add_argument('--text', help="Full-text search over names and addresses, e.g. 'smile*'")
+    query_parser.add_argument('--history', action='store_true', help="Every run's copy rather than the newest")
+    query_parser.add_argument('--limit', type=int, default=100)
+    query_parser.add_argument('--json', action='store_true')
+
+    serve_parser = commands.add_parser('serve', help="Serve read-only JSON queries on localhost")
+    serve_parser.add_argument('--port', type=int, default=8765)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        server = make_index_server(args.index, args.port)
+        print(f"Serving {args.index} at http://127.0.0.1:{server.server_address[1]}/records", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    index = RecordIndex(args.index)
+    try:
+        if args.command == 'load':
+            for path in args.files:
+                print(f"{path}: {index.load(path, args.sedation)} records loaded", file=sys.stderr)
+            print(index.summary(), file=sys.stderr)
+            return 0
+
+        started = time.perf_counter()
+        try:
+            records = index.query(args.city, args.postal, args.sedation, args.business, args.text, args.history, args.limit)
+        except sqlite3.Error as e:
+            # Usually full-text syntax, e.g. punctuation outside double quotes in --text
+            parser.error(f"invalid query: {e}. Put --text terms with punctuation in double quotes")
+        elapsed = time.perf_counter() - started
+    finally:
+        index.close()
+
+    if args.json:
+        print(json.dumps(records, indent=2))
+    else:
+        for record in records:
+            print(f"{record['Name']}, {record['Business Name']}, {record['Address']}, {record['City']}"
+                  f"{', ' + record['Sedation'] if record['Sedation'] else ''}")
+    print(f"{len(records)} records in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+import re
+import sys
+import time
+from functools import lru_cache
+
+from sinks import COLUMNS, open_sink
+
+# Columnar record batches and the normalization and deduplication passes
+# that run over them. Records that differ only in whitespace, case, street
+# suffix spelling or postal code formatting collapse onto the same key, so
+# merged city runs of 100k+ rows dedupe in a single hash pass. Normalizers
+# are memoized since names, cities and addresses repeat heavily.
+
+POSTAL_CODE = re.compile(r'([A-Z]\d[A-Z])\s*(\d[A-Z]\d)')
+NON_WORD = re.compile(r'[^\w#]+')
+
+STREET_SUFFIXES = {
+    'street': 'st', 'road': 'rd', 'drive': 'dr', 'avenue': 'ave', 'boulevard': 'blvd',
+    'court': 'crt', 'crescent': 'cres', 'place': 'pl', 'parkway': 'pkwy', 'highway': 'hwy',
+    'lane': 'ln', 'square': 'sq', 'circle': 'cir', 'terrace': 'terr', 'trail': 'trl',
+    'east': 'e', 'west': 'w', 'north': 'n', 'south': 's',
+    'unit': '#', 'suite': '#', 'ste': '#',
+}
+
+
+@lru_cache(maxsize=65536)
+def normalize_text(value):
+    return ' '.join(str(value or '').split()).casefold()
+
+@lru_cache(maxsize=65536)
+def normalize_name(value):
+    return ' '.join(NON_WORD.sub(' ', normalize_text(value)).split())
+
+@lru_cache(maxsize=65536)
+def normalize_address(value):
+    words = NON_WORD.sub(' ', normalize_text(value).replace('#', ' # ')).split()
+    return ' '.join(STREET_SUFFIXES.get(word, word) for word in words).replace('# ', '#')
+
+@lru_cache(maxsize=65536)
+def normalize_postal_code(value):
+    match = POSTAL_CODE.search(str(value or '').upper())
+    return f"{match.group(1)} {match.group(2)}" if match else ''
+
+def city_matcher(search_city):
+    # Normalize the search city once, not once per location
+    city = normalize_text(search_city)
+    return lambda city_state_zip: city in normalize_text(city_state_zip)
+
+def record_key(record):
+    # Records of a combined batch file also differ by the sedation filter that found them
+    key = (normalize_name(record.get('Name')), normalize_name(record.get('Business Name')),
+           normalize_address(record.get('Address')), normalize_postal_code(record.get('City')))
+    if 'Sedation' in record:
+        key += (normalize_text(record['Sedation']),)
+    return key
+
+
+class RecordBatch:
+    __slots__ = ('columns',)
+
+    def __init__(self, columns=None):
+        self.columns = columns if columns is not None else {column: [] for column in COLUMNS}
+
+    @classmethod
+    def from_records(cls, records, columns=None):
+        # Without columns, the base columns plus any others the records have,
+        # e.g. Sedation or the geocoded coordinates
+        records = list(records)
+        if columns is None:
+            columns = dict.fromkeys(COLUMNS)
+            for record in records:
+                columns.update(dict.fromkeys(record))
+        return cls({column: [record.get(column, '') or '' for record in records] for column in columns})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def extend(self, other):
+        # Columns only one side has are padded with blanks, so every column stays the same length
+        length, added = len(self), len(other)
+        for column, values in other.columns.items():
+            self.columns.setdefault(column, [''] * length).extend(values)
+        for column, values in self.columns.items():
+            if column not in other.columns:
+                values.extend([''] * added)
+
+    def take(self, indices):
+        return RecordBatch({column: [values[i] for i in indices] for column, values in self.columns.items()})
+
+    def records(self):
+        names = list(self.columns)
+        return [dict(zip(names, row)) for row in zip(*self.columns.values())]
+
+    def keys(self):
+        # One normalization pass per column, then the columns are zipped into keys
+        columns = self.columns
+        empty = [''] * len(self)
+        names = map(normalize_name, columns.get('Name', empty))
+        businesses = map(normalize_name, columns.get('Business Name', empty))
+        addresses = map(normalize_address, columns.get('Address', empty))
+        postal_codes = map(normalize_postal_code, columns.get('City', empty))
+        if 'Sedation' in columns:
+            return list(zip(names, businesses, addresses, postal_codes, map(normalize_text, columns['Sedation'])))
+        return list(zip(names, businesses, addresses, postal_codes))
+
+
+def dedupe(batch):
+    # Returns the deduplicated batch and how long each stage took
+    timings = {}
+    start = time.perf_counter()
+    keys = batch.keys()
+    timings['normalize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = {}
+    for index, key in enumerate(keys):
+        first.setdefault(key, index)
+    timings['hash'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    unique = batch.take(sorted(first.values()))
+    timings['take'] = time.perf_counter() - start
+    return unique, timings
+
+def read_records(path):
+    fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'csv':
+        with open(path, encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+    if fmt == 'jsonl':
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if fmt == 'xlsx':
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell) for cell in next(rows)]
+        records = [dict(zip(header, ('' if cell is None else str(cell) for cell in row))) for row in rows]
+        workbook.close()
+        return records
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).to_pylist()
+    raise ValueError(f"Unknown export format: {fmt}")
+
+def merge_files(paths):
+    batch = RecordBatch()
+    for path in paths:
+        batch.extend(RecordBatch.from_records(read_records(path)))
+    return dedupe(batch)
+
+if __name__ == "__main__":
+    # python records.py merged.csv individual/*.xlsx
+    if len(sys.argv) < 3:
+        print("Usage: python records.py OUTPUT INPUT [INPUT ...]", file=sys.stderr)
+        sys.exit(2)
+
+    start = time.perf_counter()
+    unique, timings = merge_files(sys.argv[2:])
+    read_time = time.perf_counter() - start - sum(timings.values())
+    sink = open_sink(sys.argv[1], columns=list(unique.columns))
+    sink.write(unique.records())
+    sink.close()
+
+    print(f"{len(unique)} unique records written to {sys.argv[1]}")
+    print(f"read {read_time:.3f}s, " + ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items()))
@@ -0,0 +1,92 @@
+import threading
+from collections import deque
+
+from records import record_key
+
+# Page scheduling for the worker pool. Pages are split into contiguous runs,
+# one per worker. A worker takes pages from the front of its own queue and,
+# once that is empty, steals from the back of the busiest other queue.
+
+
+class PageScheduler:
+    def __init__(self, pages, workers):
+        pages = list(pages)
+        self.lock = threading.Lock()
+        self.queues = [deque() for _ in range(max(workers, 1))]
+        self.stopped = False
+        self.total = len(pages)
+        self.finished = 0
+
+        chunk = -(-len(pages) // len(self.queues)) if pages else 0
+        for i, queue in enumerate(self.queues):
+            queue.extend(pages[i * chunk:(i + 1) * chunk])
+
+    def next_page(self, worker):
+        with self.lock:
+            if self.stopped:
+                return None
+            own = self.queues[worker]
+            if own:
+                return own.popleft()
+            victim = max(self.queues, key=len)
+            if victim:
+                return victim.pop()
+            return None
+
+    def page_done(self):
+        # Returns the share of pages finished, for progress reporting
+        with self.lock:
+            self.finished += 1
+            return self.finished / self.total if self.total else 1.0
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+
+
+class SharedResults:
+    # Records from every worker, grouped by page so the output keeps the
+    # site's ordering no matter which worker finished first. New records are
+    # streamed to the sink as they arrive; keep=False stops holding them in
+    # memory when only the exported file is needed. The limit is a quota
+    # shared by every worker: records past it are dropped, never written.
+    def __init__(self, limit, sink=None, keep=True):
+        self.limit = limit
+        self.sink = sink
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.seen = set()
+        self.count = 0
+        self.sealed = False
+
+    def add(self, page_number, records):
+        with self.lock:
+            fresh = []
+            for record in records:
+                if self.sealed or self.count + len(fresh) >= self.limit:
+                    break
+                key = record_key(record)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    fresh.append(record)
+
+            if self.keep:
+                self.pages.setdefault(page_number, []).extend(fresh)
+            if self.sink is not None:
+                self.sink.write(fresh)
+            self.count += len(fresh)
+            return self.count
+
+    def seal(self):
+        # Workers left behind by a cancelled run can't write after the sink is closed
+        with self.lock:
+            self.sealed = True
+
+    def full(self):
+        with self.lock:
+            return self.count >= self.limit
+
+    def records(self):
+        with self.lock:
+            return [record for number in sorted(self.pages) for record in self.pages[number]]
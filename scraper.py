@@ -1,292 +1,37 @@
 import sys
-import time
-import pandas as pd
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QLineEdit, QLabel, QTextEdit, QFrame, QScrollArea)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve, QRect, QTimer, QElapsedTimer
+                             QPushButton, QLineEdit, QLabel, QListView, QFrame, QComboBox, QCheckBox)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve, QRect
 from PyQt5.QtGui import QFont, QPalette, QColor
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from concurrent.futures import ThreadPoolExecutor
-import os
-import random
-
-# Define the base URL for scraping
-base_url = "https://www.rcdso.org/find-a-dentist/search-results?Alpha=&City={}&MbrSpecialty=&ConstitID=&AlphaParent=&Address1=&PhoneNum=&SedationType=&SedationProviderType=&GroupCode=&DetailsCode="
-
-# Setup Selenium WebDriver
-def setup_driver():
-    options = Options()
-    options.add_argument('--ignore-certificate-errors')  # Ignore SSL certificate errors
-    
-    # Get the path to the ChromeDriver executable
-    chrome_driver_path = ChromeDriverManager().install()
-    
-    # Ensure we're using the correct executable
-    if chrome_driver_path.endswith('THIRD_PARTY_NOTICES.chromedriver'):
-        chrome_driver_path = os.path.dirname(chrome_driver_path)
-        chrome_driver_path = os.path.join(chrome_driver_path, 'chromedriver.exe')
-    
-    # Print the path for debugging
-    print(f"ChromeDriver path: {chrome_driver_path}")
-    
-    # Check if the file exists
-    if not os.path.exists(chrome_driver_path):
-        raise FileNotFoundError(f"ChromeDriver not found at {chrome_driver_path}")
-    
-    # Create the Service object with the ChromeDriver path
-    service = Service(chrome_driver_path)
-    
-    # Create the driver with the service and options
-    driver = webdriver.Chrome(service=service, options=options)
-    
-    return driver
-
-def scrape_current_page(driver, dentists, limit, search_city, sedation_check, update_status):
-    items = driver.find_elements(By.CSS_SELECTOR, 'div#dentistSearchResults .row')
-    visible_items = [item for item in items if item.is_displayed()]
-    update_status.emit(f"Found {len(visible_items)} visible items on the current page.")
-    
-    if not visible_items:
-        update_status.emit("No visible dentist search results found.")
-        return False
-
-    for item in visible_items[:10]:  # Process 10 results at a time
-        if len(dentists) >= limit:
-            return False
-
-        try:
-            name = item.find_element(By.CSS_SELECTOR, 'h2').text.strip()
-
-            # Click on the name to go to the details page
-            name_link = item.find_element(By.CSS_SELECTOR, 'h2 a')
-            driver.execute_script("arguments[0].scrollIntoView();", name_link)
-            time.sleep(1)
-            try:
-                name_link.click()
-            except Exception as e:
-                update_status.emit(f"Click intercepted, retrying: {e}")
-                driver.execute_script("arguments[0].click();", name_link)
-
-            # Check for the specialty
-            try:
-                specialty = driver.find_element(By.XPATH, '//dt[text()="Specialty:"]/following-sibling::dd').text.strip()
-                update_status.emit(f"Specialty found for dentist: {name}, skipping...")
-                driver.back()
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-                time.sleep(1)  # Ensure the previous page has loaded
-                continue
-            except Exception:
-                pass
-
-            # Check for the "Primary Practice" section
-            try:
-                driver.find_element(By.XPATH, '//h3[text()="Primary Practice"]')
-            except Exception as e:
-                update_status.emit(f"No Primary Practice section for dentist: {name}, skipping...")
-                driver.back()
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-                time.sleep(1)  # Ensure the previous page has loaded
-                continue
-
-            # Check for the "View Facility Permits" link
-            try:
-                permit_link = driver.find_element(By.LINK_TEXT, 'View Facility Permits')
-                driver.execute_script("arguments[0].scrollIntoView();", permit_link)
-                time.sleep(1)
-                try:
-                    permit_link.click()
-                except Exception as e:
-                    update_status.emit(f"Click intercepted, retrying: {e}")
-                    driver.execute_script("arguments[0].click();", permit_link)
-
-                # Check the sedation type
-                try:
-                    sedation_type_element = driver.find_element(By.XPATH, '//dt[contains(text(), "Highest Level Of Sedation")]/following-sibling::dd')
-                    sedation_type = sedation_type_element.text.strip()
-                    update_status.emit(f"Sedation type found for dentist {name}: {sedation_type}")
-                    if sedation_check not in sedation_type:
-                        update_status.emit(f"Sedation type {sedation_type} does not contain {sedation_check}, skipping...")
-                        driver.back()
-                        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistDetails')))
-                        time.sleep(1)  # Ensure the previous page has loaded
-                        driver.back()
-                        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-                        time.sleep(1)  # Ensure the previous page has loaded
-                        continue
-                except Exception as e:
-                    update_status.emit(f"No sedation type found for dentist: {name}, skipping... {e}")
-                    driver.back()
-                    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistDetails')))
-                    time.sleep(1)  # Ensure the previous page has loaded
-                    driver.back()
-                    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-                    time.sleep(1)  # Ensure the previous page has loaded
-                    continue
-
-                driver.back()
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistDetails')))
-                time.sleep(1)  # Ensure the previous page has loaded
-            except Exception:
-                # No need to print anything if the link is not found
-                pass
-
-            # Click on the "See All Practice Locations" link
-            try:
-                expand_link = driver.find_element(By.XPATH, '//a[@data-collapsible-toggle]')
-                driver.execute_script("arguments[0].click();", expand_link)
-                time.sleep(1)  # Ensure the section expands
-            except Exception as e:
-                update_status.emit(f"Error expanding practice locations: {e}")
-
-            # Extract details from all practice locations
-            locations = driver.find_elements(By.CSS_SELECTOR, 'div[data-collapsible-toggled] .row')
-            for location in locations:
-                try:
-                    try:
-                        business_name = location.find_element(By.CSS_SELECTOR, 'h6').text.strip()
-                    except Exception:
-                        business_name = ''
-
-                    address_tag = location.find_element(By.CSS_SELECTOR, 'address')
-                    spans = address_tag.find_elements(By.TAG_NAME, 'span')
-                    if len(spans) >= 3:
-                        address = spans[0].text.strip()
-                        city_state_zip = spans[1].text.strip().replace(',', '')
-                        zip_code = spans[2].text.strip()
-                        city = f"{search_city} ON {zip_code}"
-                        if search_city.lower() not in city_state_zip.lower():
-                            continue  # Skip locations not matching the search city
-                    else:
-                        address = ''
-                        zip_code = ''
-                        city = ''
-
-                    dentists.append({
-                        'Name': name,
-                        'Business Name': business_name,
-                        'Address': address,
-                        'City': city
-                    })
-                    update_status.emit(f"Found dentist: {name}, {business_name}, {address}, {city}")
-                except Exception as e:
-                    update_status.emit(f"Error extracting location details: {e}")
-
-            # Go back to the previous page
-            driver.back()
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-            time.sleep(1)  # Ensure the previous page has loaded
-
-        except Exception as e:
-            update_status.emit(f"Error parsing dentist entry: {e}")
-            update_status.emit(item.get_attribute('outerHTML'))
-
-        if len(dentists) >= limit:
-            break
-
-    return True
-
-def navigate_to_last_page(driver, update_status):
-    while True:
-        try:
-            # Locate the last page button by finding the page link that comes after the ellipsis
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(1)  # Ensure the page scroll completes
-            ellipsis = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//span[@class="page-link" and text()="..."]/parent::li/following-sibling::li/a'))
-            )
-            driver.execute_script("arguments[0].scrollIntoView();", ellipsis)
-            time.sleep(1)
-            ellipsis.click()
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-            time.sleep(1)  # Ensure last page has loaded
-            break
-        except Exception as e:
-            update_status.emit(f"Error navigating to last page: {e}")
-            break
-
-def get_dentists(url, limit, reverse, search_city, sedation_check, update_status, update_progress):
-    driver = setup_driver()
-    dentists = []
-
-    update_status.emit(f"Fetching data from URL: {url}")
-    driver.get(url)
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row')))
-    time.sleep(1)  # Ensure page has loaded
-
-    if reverse:
-        # Navigate to the last page
-        navigate_to_last_page(driver, update_status)
-
-    while len(dentists) < limit:
-        if not scrape_current_page(driver, dentists, limit, search_city, sedation_check, update_status):
-            break
-
-        # Update progress based on the number of dentists scraped
-        update_progress.emit(len(dentists))
-
-        if len(dentists) >= limit:
-            break
-
-        # Scroll to the bottom of the page to ensure the "Next" or "Previous" button is in view
-        update_status.emit("Scrolling to the bottom of the page")
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-
-        # Check if there's a "Next" or "Previous" button to load more results
-        try:
-            if reverse:
-                button = WebDriverWait(driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, '//a[@class="page-link prev"]'))
-                )
-            else:
-                button = WebDriverWait(driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, '//a[@class="page-link next"]'))
-                )
-            update_status.emit(f"{button.text} button found. Clicking to reveal more results.")
-            button.click()
-
-            # Wait for the new set of results to be visible
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'div#dentistSearchResults .row'))
-            )
-            update_status.emit("More results revealed. Continuing to scrape.")
-        except Exception as e:
-            update_status.emit(f"No more results to reveal or error occurred: {e}")
-            break
-
-    driver.quit()
-    return dentists
-
-def remove_duplicates(dentists):
-    unique_dentists = []
-    seen = set()
-    for dentist in dentists:
-        dentist_tuple = tuple(dentist.items())
-        if dentist_tuple not in seen:
-            seen.add(dentist_tuple)
-            unique_dentists.append(dentist)
-    return unique_dentists
+from engine import DEFAULT_WORKERS, output_file, scrape
+from control import RunController
+from sinks import FORMATS
+from log_view import StatusLog
 
 class ScraperThread(QThread):
     update_progress = pyqtSignal(int)
-    update_status = pyqtSignal(str)
     scraping_finished = pyqtSignal(list)
 
-    def __init__(self, url, limit, reverse, search_city, sedation_check):
+    def __init__(self, search_city, sedation_check, limit, backend='http', workers=4, use_cache=True, incremental=False, resume=False,
+                 output_format='xlsx', on_status=None):
         QThread.__init__(self)
-        self.url = url
-        self.limit = limit
-        self.reverse = reverse
+        # Status messages go straight to the log buffer rather than through one signal each
+        self.on_status = on_status
+        self.controller = RunController()
         self.search_city = search_city
         self.sedation_check = sedation_check
+        self.limit = limit
+        self.backend = backend
+        self.workers = workers
+        self.use_cache = use_cache
+        self.incremental = incremental
+        self.resume = resume
+        self.output_format = output_format
 
     def run(self):
-        dentists = get_dentists(self.url, self.limit, self.reverse, self.search_city, self.sedation_check, self.update_status, self.update_progress)
+        dentists = scrape(self.search_city, self.sedation_check, self.limit, self.workers, self.backend, self.output_format,
+                          use_cache=self.use_cache, incremental=self.incremental, resume=self.resume, keep_records=False,
+                          controller=self.controller, on_status=self.on_status, on_progress=self.update_progress.emit)
         self.scraping_finished.emit(dentists)
 
 class MainWindow(QMainWindow):
@@ -297,7 +42,8 @@ class MainWindow(QMainWindow):
         self.setStyleSheet("""
             QMainWindow { background-color: #2b2b2b; }
             QLabel { color: #e0e0e0; font-size: 12px; }
-            QLineEdit {
+            QCheckBox { color: #e0e0e0; font-size: 12px; }
+            QLineEdit, QComboBox {
                 background-color: #3b3b3b; border: 1px solid #555555;
                 border-radius: 3px; color: #e0e0e0; padding: 3px;
                 font-size: 12px;
@@ -307,7 +53,7 @@ class MainWindow(QMainWindow):
                 border-radius: 3px; padding: 5px; font-size: 12px;
             }
             QPushButton:hover { background-color: #5a5a5a; }
-            QTextEdit {
+            QListView {
                 background-color: #3b3b3b; color: #e0e0e0;
                 border: 1px solid #555555; border-radius: 3px; font-size: 12px;
             }
@@ -356,10 +102,34 @@ class MainWindow(QMainWindow):
         self.sedation_input.setPlaceholderText("Enter sedation type")
         self.limit_input = QLineEdit()
         self.limit_input.setPlaceholderText("Enter limit (e.g., 150)")
+        self.workers_input = QLineEdit()
+        self.workers_input.setPlaceholderText(f"Number of workers (default {DEFAULT_WORKERS})")
 
         input_layout.addLayout(self.create_input_field("City:", self.city_input))
         input_layout.addLayout(self.create_input_field("Sedation:", self.sedation_input))
+        self.backend_input = QComboBox()
+        self.backend_input.addItem("HTTP", 'http')
+        self.backend_input.addItem("HTTP (async)", 'async')
+        self.backend_input.addItem("Selenium", 'selenium')
+
         input_layout.addLayout(self.create_input_field("Limit:", self.limit_input))
+        input_layout.addLayout(self.create_input_field("Workers:", self.workers_input))
+        input_layout.addLayout(self.create_input_field("Backend:", self.backend_input))
+
+        self.cache_input = QCheckBox("Reuse pages cached by earlier runs")
+        self.cache_input.setChecked(True)
+        input_layout.addLayout(self.create_input_field("Cache:", self.cache_input))
+
+        self.incremental_input = QCheckBox("Skip unchanged dentists and report changes")
+        input_layout.addLayout(self.create_input_field("Incremental:", self.incremental_input))
+
+        self.resume_input = QCheckBox("Continue an interrupted run from its checkpoint")
+        input_layout.addLayout(self.create_input_field("Resume:", self.resume_input))
+
+        self.format_input = QComboBox()
+        for fmt in FORMATS:
+            self.format_input.addItem(fmt, fmt)
+        input_layout.addLayout(self.create_input_field("Format:", self.format_input))
 
         main_layout.addWidget(input_frame)
 
@@ -385,6 +155,17 @@ class MainWindow(QMainWindow):
         """)
         main_layout.addWidget(self.start_button)
 
+        # Pause and cancel the running search
+        control_layout = QHBoxLayout()
+        self.pause_button = QPushButton("Pause")
+        self.pause_button.clicked.connect(self.toggle_pause)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_scraping)
+        control_layout.addWidget(self.pause_button)
+        control_layout.addWidget(self.cancel_button)
+        main_layout.addLayout(control_layout)
+        self.set_running(False)
+
         # Progress bar
         self.progress_container = QFrame()
         self.progress_container.setStyleSheet("""
@@ -406,16 +187,12 @@ class MainWindow(QMainWindow):
         self.progress_bar.setFixedHeight(8)
         self.progress_bar.setFixedWidth(0)
 
-        # Add a new attribute to track the progress
-        self.progress = 0
-
         # Status text
         status_label = QLabel("Status:")
         main_layout.addWidget(status_label)
 
-        self.status_text = QTextEdit()
-        self.status_text.setReadOnly(True)
-        self.status_text.setStyleSheet("""
+        self.status_view = QListView()
+        self.status_view.setStyleSheet("""
             padding: 5px;
             background-color: #3b3b3b;
             color: #e0e0e0;
@@ -423,12 +200,8 @@ class MainWindow(QMainWindow):
             border-radius: 3px;
             font-size: 12px;
         """)
-
-        scroll_area = QScrollArea()
-        scroll_area.setWidget(self.status_text)
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setStyleSheet("border: none;")
-        main_layout.addWidget(scroll_area)
+        main_layout.addWidget(self.status_view)
+        self.status_log = StatusLog(self.status_view)
 
         self.all_dentists = []
 
@@ -454,7 +227,7 @@ class MainWindow(QMainWindow):
 
         # Check if any field is empty
         if not search_city or not sedation_check or not limit_text:
-            self.update_status('<span style="color: #ff0000;">Error: All fields must be filled. Please provide City, Sedation type, and Limit.</span>')
+            self.update_status('Error: All fields must be filled. Please provide City, Sedation type, and Limit.', 'error')
             return
 
         try:
@@ -462,78 +235,90 @@ class MainWindow(QMainWindow):
             if limit <= 0:
                 raise ValueError("Limit must be a positive integer")
         except ValueError:
-            self.update_status('<span style="color: #ff0000;">Error: Limit must be a valid positive integer.</span>')
+            self.update_status('Error: Limit must be a valid positive integer.', 'error')
             return
 
-        url = base_url.format(search_city)
+        workers_text = self.workers_input.text().strip()
+        try:
+            workers = int(workers_text) if workers_text else DEFAULT_WORKERS
+            if workers <= 0:
+                raise ValueError("Workers must be a positive integer")
+        except ValueError:
+            self.update_status('Error: Workers must be a valid positive integer.', 'error')
+            return
 
-        self.thread1 = ScraperThread(url, limit // 2, False, search_city, sedation_check)
-        self.thread2 = ScraperThread(url, limit // 2, True, search_city, sedation_check)
+        backend = self.backend_input.currentData()
+        output_format = self.format_input.currentData()
 
-        self.thread1.update_status.connect(self.update_status)
-        self.thread2.update_status.connect(self.update_status)
-        self.thread1.update_progress.connect(self.update_progress)
-        self.thread2.update_progress.connect(self.update_progress)
-        self.thread1.scraping_finished.connect(self.handle_results)
-        self.thread2.scraping_finished.connect(self.handle_results)
+        self.output_path = output_file(search_city, output_format)
+        self.thread = ScraperThread(search_city, sedation_check, limit, backend, workers,
+                                   self.cache_input.isChecked(), self.incremental_input.isChecked(), self.resume_input.isChecked(),
+                                   output_format, self.status_log.append)
+        self.thread.update_progress.connect(self.update_progress)
+        self.thread.scraping_finished.connect(self.handle_results)
 
         self.all_dentists = []
-        self.threads_finished = 0
-        self.total_progress = 0
-        self.total_limit = limit
-
-        self.progress = 0
         self.progress_bar.setFixedWidth(0)
-        self.start_controlled_progress()
 
-        self.thread1.start()
-        self.thread2.start()
+        self.set_running(True)
+        self.thread.start()
 
         self.update_status('Scraping started...')
 
-    def start_controlled_progress(self):
-        self.progress_timer = QTimer(self)
-        self.progress_timer.timeout.connect(self.update_controlled_progress)
-        self.progress_timer.start(100)  # Update every 100ms
-
-    def update_controlled_progress(self):
-        if self.threads_finished < 2:
-            # Slowly increase progress up to 95% while threads are running
-            self.progress = min(self.progress + 0.1, 95)
-            width = int(self.progress_container.width() * (self.progress / 100))
-            self.progress_bar.setFixedWidth(width)
+    def set_running(self, running):
+        self.start_button.setEnabled(not running)
+        self.pause_button.setEnabled(running)
+        self.cancel_button.setEnabled(running)
+        self.pause_button.setText("Pause")
+
+    def toggle_pause(self):
+        controller = self.thread.controller
+        if controller.paused:
+            controller.resume()
+            self.pause_button.setText("Pause")
+            self.update_status('Resumed.')
         else:
-            # Both threads finished, set to 100%
-            self.progress_bar.setFixedWidth(self.progress_container.width())
-            self.progress_timer.stop()
+            controller.pause()
+            self.pause_button.setText("Resume")
+            self.update_status('Paused, workers stop after their current dentist.')
+
+    def cancel_scraping(self):
+        # Workers finish their current dentist and the partial results are saved
+        self.thread.controller.cancel()
+        self.pause_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+        self.update_status('Cancelling, saving the records collected so far...')
 
-    def update_status(self, status):
-        self.status_text.append(status)
+    def update_status(self, status, level=None):
+        self.status_log.append(status, level)
 
     def update_progress(self, value):
-        self.total_progress += value
-        progress_percentage = min(self.total_progress / self.total_limit, 1)
-        width = int(self.progress_container.width() * progress_percentage)
+        # Workers report the percentage of pages done, or of the limit if further along
+        width = int(self.progress_container.width() * min(value, 100) / 100)
         self.progress_bar.setFixedWidth(width)
 
     def handle_results(self, dentists):
         self.all_dentists.extend(dentists)
-        self.threads_finished += 1
+        self.set_running(False)
+
+        self.save_results(self.all_dentists)
+
+        # Ensure progress bar is at 100%
+        self.progress_bar.setFixedWidth(self.progress_container.width())
 
-        if self.threads_finished == 2:
-            # Both threads have finished
-            unique_dentists = remove_duplicates(self.all_dentists)
-            self.save_results(unique_dentists)
-            
-            # Ensure progress bar is at 100%
-            self.progress_bar.setFixedWidth(self.progress_container.width())
-            self.progress_timer.stop()
+    def closeEvent(self, event):
+        # Stop a running search so its partial results are saved, then write
+        # out the last frame of the log before the window goes away
+        thread = getattr(self, 'thread', None)
+        if isinstance(thread, ScraperThread) and thread.isRunning():
+            thread.controller.cancel()
+            thread.wait()
+        self.status_log.close()
+        super().closeEvent(event)
 
     def save_results(self, dentists):
-        df = pd.DataFrame(dentists)
-        excel_file_path = f'dentists_in_{self.city_input.text()}_filtered.xlsx'
-        df.to_excel(excel_file_path, index=False)
-        self.update_status(f'<span style="color: #00ff00;">Data saved to {excel_file_path}</span>')
+        # The records were already streamed to the output file during the run
+        self.update_status(f'Data saved to {self.output_path}', 'success')
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
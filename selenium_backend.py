@@ -0,0 +1,93 @@
+from selenium.common.exceptions import WebDriverException
+
+from driver_pool import shared_pool, quit_driver
+from waits import adaptive_wait, document_ready, element_present
+from parsing import RESULTS_ROW_SELECTOR, parse_results, parse_detail, parse_permits
+from extract_js import extract_results, extract_detail, extract_permits
+from metrics import metrics
+
+# Selenium fetch backend, for when the site needs a real browser. Pages are
+# loaded by URL in a pooled Chrome session and read from the live DOM with
+# one injected script per page.
+
+
+class SeleniumBackend:
+    name = 'selenium'
+
+    def __init__(self, pool=None, waits=None, cache=None):
+        # Lease a warm browser instead of launching Chrome for every run
+        self.pool = pool if pool is not None else shared_pool()
+        self.driver = self.pool.lease()
+        self.waits = waits if waits is not None else adaptive_wait
+        self.cache = cache
+        self.pages = 0
+        self.crashed = False
+
+    def load(self, url, step, condition):
+        # Every page is addressed directly, so there is no back-navigation
+        try:
+            with metrics.span('page_load', kind=step):
+                self.driver.get(url)
+        except WebDriverException:
+            self.crashed = True
+            metrics.incr('errors', stage='driver')
+            raise
+        self.pages += 1
+        self.waits.until(self.driver, step, condition)
+
+    def cached(self, url, kind, parse):
+        # Pages rendered by an earlier run are parsed statically while fresh.
+        # The browser can't revalidate, so stale pages are simply reloaded
+        cached = self.cache.get(url, kind) if self.cache is not None else None
+        if cached is not None and cached['fresh']:
+            with metrics.span('extract', kind=kind):
+                return parse(cached['body'], url)
+        return None
+
+    def store(self, url, kind):
+        if self.cache is not None:
+            self.cache.put(url, kind, self.driver.page_source)
+
+    def results_page(self, url):
+        page = self.cached(url, 'results', parse_results)
+        if page is not None:
+            return page
+
+        # Collect every detail href up front so the results page is loaded once
+        self.load(url, 'results', element_present(RESULTS_ROW_SELECTOR))
+        with metrics.span('extract', kind='results'):
+            page = extract_results(self.driver, url)
+        self.store(url, 'results')
+        return page
+
+    def detail_page(self, url):
+        detail = self.cached(url, 'detail', parse_detail)
+        if detail is not None:
+            return detail
+
+        self.load(url, 'detail', element_present('div#dentistDetails'))
+        with metrics.span('extract', kind='detail'):
+            detail = extract_detail(self.driver, url)
+        self.store(url, 'detail')
+        return detail
+
+    def permits_page(self, url):
+        permits = self.cached(url, 'permits', parse_permits)
+        if permits is not None:
+            return permits
+
+        self.load(url, 'permits', document_ready)
+        with metrics.span('extract', kind='permits'):
+            permits = extract_permits(self.driver, url)
+        self.store(url, 'permits')
+        return permits
+
+    def abort(self):
+        # Called from another thread when a cancelled run overruns: quitting
+        # the browser fails the page load in flight, and the pool replaces it
+        self.crashed = True
+        quit_driver(self.driver)
+
+    def close(self):
+        # Hand the browser back to the pool, which decides whether to recycle it
+        self.pool.release(self.driver, self.pages, self.crashed)
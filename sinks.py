@@ -0,0 +1,143 @@
+import csv
+import json
+import os
+import threading
+
+from metrics import metrics
+
+# Streaming export writers. Records are buffered and written in batches as
+# the workers produce them, so results reach the disk during the run rather
+# than all at once at the end. Each format only imports what it needs.
+
+COLUMNS = ['Name', 'Business Name', 'Address', 'City']
+FORMATS = ('xlsx', 'csv', 'jsonl', 'parquet')
+
+
+class RecordSink:
+    batch_size = 100
+
+    def __init__(self, path, columns=COLUMNS, batch_size=None):
+        self.path = path
+        self.columns = list(columns)
+        self.batch_size = batch_size or self.batch_size
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.written = 0
+        self.open()
+
+    def write(self, records):
+        with self.lock:
+            self.buffer.extend(records)
+            if len(self.buffer) >= self.batch_size:
+                self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if self.buffer:
+            with metrics.span('export', format=self.name):
+                self.write_batch([{column: record.get(column, '') for column in self.columns} for record in self.buffer])
+            self.written += len(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            # Formats that assemble the file at the end (xlsx) do most of their work here
+            with metrics.span('export', format=self.name):
+                self.finish()
+
+    def open(self):
+        raise NotImplementedError
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+
+class JsonlSink(RecordSink):
+    name = 'jsonl'
+
+    def open(self):
+        self.file = open(self.path, 'w', encoding='utf-8')
+
+    def write_batch(self, rows):
+        self.file.writelines(json.dumps(row) + '\n' for row in rows)
+        self.file.flush()
+
+    def finish(self):
+        self.file.close()
+
+
+class CsvSink(RecordSink):
+    name = 'csv'
+
+    def open(self):
+        self.file = open(self.path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns)
+        self.writer.writeheader()
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def finish(self):
+        self.file.close()
+
+
+class ParquetSink(RecordSink):
+    name = 'parquet'
+    # Every batch becomes one row group
+    batch_size = 1000
+
+    def open(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.string()) for column in self.columns])
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write_batch(self, rows):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def finish(self):
+        self.writer.close()
+
+
+class XlsxSink(RecordSink):
+    # openpyxl's write-only mode streams rows to a temporary file instead of
+    # keeping the worksheet in memory; the workbook is assembled on close
+    name = 'xlsx'
+
+    def open(self):
+        from openpyxl import Workbook
+
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append(self.columns)
+
+    def write_batch(self, rows):
+        for row in rows:
+            self.sheet.append([row[column] for column in self.columns])
+
+    def finish(self):
+        self.workbook.save(self.path)
+
+
+SINKS = {
+    'xlsx': XlsxSink,
+    'csv': CsvSink,
+    'jsonl': JsonlSink,
+    'parquet': ParquetSink,
+}
+
+def open_sink(path, fmt=None, columns=COLUMNS):
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return SINKS[fmt](path, columns)
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import pytest
+
+from conftest import read_fixture
+from async_fetch import AsyncHttpBackend, RetryableStatus, TokenBucket, backoff_delay, host_bucket
+from backends import HttpBackend, RequestAborted
+from filters import FilterPipeline
+from fixture_server import save_fixture, start_fixture_server
+from metrics import metrics
+
+# The async backend against the local fixture server, which injects latency
+# and 429/503 responses
+
+pytest.importorskip('aiohttp')
+
+DENTISTS = 10
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    # Ten dentists sharing one permits page, and a results page
+    directory = str(tmp_path_factory.mktemp('site'))
+    for number in range(DENTISTS):
+        save_fixture(directory, f"/find-a-dentist/dentist?id={number}", read_fixture('detail.html'))
+    save_fixture(directory, '/find-a-dentist/permits?id=101', read_fixture('permits.html'))
+    save_fixture(directory, '/find-a-dentist/search-results?City=Brampton', read_fixture('results.html'))
+    return directory
+
+@pytest.fixture
+def serve(site):
+    servers = []
+
+    def serve(**options):
+        server, addr = start_fixture_server(site, **options)
+        servers.append(server)
+        return addr
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def backend():
+    backends = []
+
+    def backend(**options):
+        options.setdefault('base_delay', 0.01)
+        options.setdefault('max_delay', 0.05)
+        backends.append(AsyncHttpBackend(**options))
+        return backends[-1]
+
+    yield backend
+    for instance in backends:
+        instance.close()
+
+def dentist_rows(addr):
+    return [{'name': f"Dentist {number}", 'detail_url': f"{addr}/find-a-dentist/dentist?id={number}"} for number in range(DENTISTS)]
+
+
+def test_backoff_delay_honours_retry_after():
+    assert backoff_delay(3, 0.5, 30, retry_after='2') == 2.0
+    assert backoff_delay(0, 0.5, 30, retry_after='120') == 30
+
+def test_backoff_delay_jitter_bounds():
+    for attempt in range(8):
+        assert 0 <= backoff_delay(attempt, 0.5, 4) <= min(4, 0.5 * 2 ** attempt)
+    # An HTTP-date Retry-After isn't parsed, it falls back to the jittered step
+    assert 0 <= backoff_delay(1, 0.5, 4, retry_after='Wed, 21 Oct 2015 07:28:00 GMT') <= 1.0
+
+def test_token_bucket_bursts_then_paces():
+    bucket = TokenBucket(rate=10, capacity=3)
+    waits = [bucket.reserve() for _ in range(6)]
+    assert waits[:3] == [0, 0, 0]
+    # Every further token is due a tenth of a second after the one before
+    assert waits[3:] == pytest.approx([0.1, 0.2, 0.3], abs=0.02)
+
+def test_host_bucket_is_shared_and_optional():
+    assert host_bucket('example.test', 0) is None
+    assert host_bucket('example.test', 5) is host_bucket('example.test', 5)
+    assert host_bucket('example.test', 5) is not host_bucket('other.test', 5)
+
+def test_fetches_every_dentist(serve, backend):
+    addr = serve()
+    pipeline = FilterPipeline()
+    results = backend(rate=0).fetch_dentists(dentist_rows(addr), pipeline)
+    assert len(results) == DENTISTS
+    for detail, permits in results.values():
+        assert detail['name'] == 'Dr. Jane Doe'
+        assert permits['sedation_type'] == 'Oral Moderate Sedation'
+
+def test_retries_through_injected_errors(serve, backend):
+    addr = serve(error_rate=0.3)
+    metrics.reset()
+    fetcher = backend(rate=0, max_retries=10)
+    results = fetcher.fetch_dentists(dentist_rows(addr), FilterPipeline())
+    assert not [result for result in results.values() if isinstance(result, Exception)]
+    assert fetcher.stats['retries'] > 0
+    assert metrics.count('retries') == fetcher.stats['retries']
+    assert fetcher.stats['requests'] == 2 * DENTISTS + fetcher.stats['retries']
+
+def test_gives_up_after_max_retries(serve, backend):
+    addr = serve(error_rate=1.0)
+    fetcher = backend(rate=0, max_retries=2)
+    results = fetcher.fetch_dentists(dentist_rows(addr)[:1], FilterPipeline())
+    error = next(iter(results.values()))
+    assert isinstance(error, RetryableStatus) and error.status in (429, 503)
+    assert fetcher.stats['requests'] == 3
+
+def test_latency_overlaps(serve, backend):
+    # Ten detail and ten permit pages at 0.2s each take 4s one after another
+    addr = serve(latency=0.2)
+    started = time.perf_counter()
+    results = backend(rate=0, concurrency=DENTISTS).fetch_dentists(dentist_rows(addr), FilterPipeline())
+    elapsed = time.perf_counter() - started
+    assert len(results) == DENTISTS
+    assert elapsed < 1.5
+
+def test_concurrency_is_shared_by_workers(serve, backend):
+    # Two workers of two dentists each make eight 0.2s requests. With two
+    # connections between them that takes 0.8s, with two each it's 0.4s
+    addr = serve(latency=0.2)
+    rows = dentist_rows(addr)
+    fetchers = [backend(rate=0, concurrency=2) for _ in range(2)]
+    workers = [threading.Thread(target=fetcher.fetch_dentists, args=(rows[2 * number:2 * number + 2], FilterPipeline()))
+               for number, fetcher in enumerate(fetchers)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert time.perf_counter() - started >= 0.75
+    assert sum(fetcher.stats['requests'] for fetcher in fetchers) == 8
+
+def test_rate_limits_requests(serve, backend):
+    # Every server gets its own port, so its host starts with a full bucket
+    addr = serve()
+    started = time.perf_counter()
+    backend(rate=5).fetch_dentists(dentist_rows(addr), FilterPipeline())
+    elapsed = time.perf_counter() - started
+    # 20 requests: 5 tokens up front, the other 15 at 5 per second
+    assert elapsed >= 2.5
+
+def test_results_pages_are_paced(serve, backend):
+    addr = serve()
+    fetcher = backend(rate=2)
+    bucket = host_bucket(addr.split('//')[1], 2)
+    bucket.reserve()
+    bucket.reserve()
+    started = time.perf_counter()
+    page = fetcher.results_page(f"{addr}/find-a-dentist/search-results?City=Brampton")
+    assert len(page['rows']) == 3
+    assert time.perf_counter() - started >= 0.4
+
+def test_http_backend_retries_through_injected_errors(serve):
+    addr = serve(error_rate=0.3)
+    metrics.reset()
+    fetcher = HttpBackend(retries=10)
+    try:
+        for _ in range(3):
+            for number in range(DENTISTS):
+                assert fetcher.detail_page(f"{addr}/find-a-dentist/dentist?id={number}")['name'] == 'Dr. Jane Doe'
+    finally:
+        fetcher.close()
+    assert metrics.count('retries') > 0
+
+def test_abort_cancels_requests_in_flight(serve, backend):
+    addr = serve(latency=5)
+    fetcher = backend(rate=0)
+    threading.Timer(0.3, fetcher.abort).start()
+    started = time.perf_counter()
+    with pytest.raises(RequestAborted):
+        fetcher.fetch_dentists(dentist_rows(addr), FilterPipeline())
+    assert time.perf_counter() - started < 2
+
+def test_close_after_abort_between_pages(serve):
+    # abort() while the loop is idle, e.g. during a results page, must not
+    # cancel close() once it runs the loop
+    addr = serve()
+    fetcher = AsyncHttpBackend(rate=0)
+    fetcher.fetch_dentists(dentist_rows(addr), FilterPipeline())
+    fetcher.abort()
+    fetcher.close()
+    assert fetcher.loop.is_closed()
+    assert fetcher.client.closed
+
+def test_aborted_http_backend_makes_no_requests(serve):
+    addr = serve()
+    fetcher = HttpBackend()
+    fetcher.abort()
+    with pytest.raises(RequestAborted):
+        fetcher.detail_page(f"{addr}/find-a-dentist/dentist?id=0")
@@ -0,0 +1,51 @@
+from page_cache import EVICT_TO, PageCache
+
+# Eviction and the running size total of the SQLite page cache
+
+PAGE = 1000
+
+
+def body(number):
+    # Distinct bodies of PAGE bytes
+    return f"{number:04d}".ljust(PAGE, 'x')
+
+def stored_bytes(cache):
+    return cache.connection.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PageCache(str(tmp_path / 'cache.sqlite3'), max_bytes=10 * PAGE)
+    for number in range(10):
+        cache.put(f"page{number}", 'detail', body(number))
+    assert cache.stats['evicted'] == 0
+
+    # Reading the two oldest pages makes pages 2 and 3 the least recently used
+    cache.get('page0', 'detail')
+    cache.get('page1', 'detail')
+    cache.put('page10', 'detail', body(10))
+
+    urls = {url for (url,) in cache.connection.execute('SELECT url FROM pages')}
+    assert urls == {f"page{number}" for number in (0, 1, *range(4, 11))}
+    assert cache.stats['evicted'] == 2
+    assert cache.total == stored_bytes(cache) <= 10 * PAGE * EVICT_TO
+    cache.close()
+
+def test_replaced_bodies_are_released(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = PageCache(path)
+    cache.put('shared1', 'detail', body(0))
+    cache.put('shared2', 'detail', body(0))
+    assert cache.total == PAGE
+
+    # The old body stays while another page still uses it
+    cache.put('shared1', 'detail', body(1))
+    assert cache.total == stored_bytes(cache) == 2 * PAGE
+    cache.put('shared2', 'detail', body(1))
+    assert cache.total == stored_bytes(cache) == PAGE
+    assert cache.get('shared2', 'detail')['body'] == body(1)
+    cache.close()
+
+    # The total is picked up again when the cache is reopened
+    cache = PageCache(path)
+    assert cache.total == PAGE
+    cache.close()
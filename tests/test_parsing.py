@@ -0,0 +1,89 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import FIXTURES, read_fixture
+from parsing import page_count, page_url, parse_detail, parse_permits, parse_results, row_fingerprint
+
+# Static parsing of saved RCDSO pages, and the Selenium extraction scripts
+# checked against it when a Chrome is available
+
+SITE = 'https://www.rcdso.org'
+SEARCH_URL = SITE + '/find-a-dentist/search-results?City=Brampton'
+
+
+def test_results_rows():
+    page = parse_results(read_fixture('results.html'), SEARCH_URL)
+    # The hidden row and the row without a link are skipped
+    assert [row['name'] for row in page['rows']] == ['Dr. Jane Doe', 'Dr. Raj Patel', "Dr. Mary O'Neil"]
+    first, second, third = page['rows']
+    assert first['detail_url'] == SITE + '/find-a-dentist/dentist?id=101&lang=en'
+    assert first['text'] == 'Dr. Jane Doe Infinity Dental Specialists Brampton, ON'
+    assert first['fingerprint'] == row_fingerprint(first['text'])
+    assert third['text'] == "Dr. Mary O'Neil Bramalea Family Dental"
+
+def test_results_specialty_label():
+    rows = parse_results(read_fixture('results.html'), SEARCH_URL)['rows']
+    # A practice named "... Specialists" is not a specialty
+    assert [row['specialty'] for row in rows] == [None, 'Orthodontics and Dentofacial Orthopedics', None]
+
+def test_results_pagination():
+    page = parse_results(read_fixture('results.html'), SEARCH_URL)
+    assert page_count(page) == 12
+    assert page['last_url'] == SITE + '/find-a-dentist/search-results?City=Brampton&page=12'
+    assert page['next_url'] == SITE + '/find-a-dentist/search-results?City=Brampton&page=2'
+    assert page['prev_url'] is None
+    assert page_url(page, 7) == SITE + '/find-a-dentist/search-results?City=Brampton&page=7'
+
+def test_detail():
+    url = SITE + '/find-a-dentist/dentist?id=101'
+    assert parse_detail(read_fixture('detail.html'), url) == {
+        'url': url,
+        'name': 'Dr. Jane Doe',
+        'specialty': None,
+        'primary_practice': True,
+        'permits_url': SITE + '/find-a-dentist/permits?id=101',
+        'locations': [
+            {'business_name': 'Infinity Dental Specialists', 'address': 'C-95 Lakeport Rd', 'city_state_zip': 'Brampton ON',
+             'zip_code': 'L6X 1A0'},
+            {'business_name': 'Queen West Dental', 'address': '400 Queen St W #202', 'city_state_zip': 'Toronto ON',
+             'zip_code': 'M5V 2A8'},
+            # Too few address lines gives a blank location, a row without an address none at all
+            {'business_name': 'Mobile Practice', 'address': '', 'city_state_zip': '', 'zip_code': ''},
+        ],
+    }
+
+def test_permits():
+    url = SITE + '/find-a-dentist/permits?id=101'
+    assert parse_permits(read_fixture('permits.html'), url) == {'url': url, 'sedation_type': 'Oral Moderate Sedation'}
+
+
+@pytest.fixture(scope='module')
+def driver():
+    pytest.importorskip('selenium')
+    if not any(shutil.which(name) for name in ('google-chrome', 'chrome', 'chromium', 'chromium-browser')):
+        pytest.skip("Chrome is not installed")
+    from driver_pool import quit_driver, setup_driver
+
+    try:
+        driver = setup_driver()
+    except Exception as e:
+        pytest.skip(f"Chrome could not be started: {e}")
+    yield driver
+    quit_driver(driver)
+
+@pytest.mark.parametrize('name, parse, extractor', [
+    ('results.html', parse_results, 'extract_results'),
+    ('detail.html', parse_detail, 'extract_detail'),
+    ('permits.html', parse_permits, 'extract_permits'),
+])
+def test_extraction_matches_parsing(driver, name, parse, extractor):
+    # Both backends have to produce the same payloads, fingerprints included
+    import pathlib
+
+    import extract_js
+
+    path = os.path.join(FIXTURES, name)
+    payload = extract_js.extract_fixture(driver, path, getattr(extract_js, extractor))
+    assert payload == parse(read_fixture(name), pathlib.Path(path).resolve().as_uri())
@@ -0,0 +1,64 @@
+import csv
+import os
+
+import pytest
+
+from record_index import RecordIndex, split_city
+
+# Loading exports into the record index and querying them
+
+
+def write_csv(path, records):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+    return str(path)
+
+def record(name, business, address, city, **extra):
+    return dict({'Name': name, 'Business Name': business, 'Address': address, 'City': city}, **extra)
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecordIndex(str(tmp_path / 'records.sqlite3'))
+    yield index
+    index.close()
+
+
+def test_split_city():
+    assert split_city('Brampton ON L6X 1A0') == ('brampton', 'L6X 1A0')
+    assert split_city('Mississauga ON l5b2c9') == ('mississauga', 'L5B 2C9')
+    assert split_city('Brampton') == ('brampton', '')
+    assert split_city(None) == ('', '')
+
+def test_load_and_query(tmp_path, index):
+    path = write_csv(tmp_path / 'dentists_in_Brampton_Oral_Moderate_filtered.csv', [
+        record('Dr. Jane Doe', 'Smile Dental', '12 Main Street', 'Brampton ON L6X 1A0'),
+        record('Dr. John Roe', 'Queen Street Dentistry', '5 Queen St E', 'Brampton ON L6V 2B2'),
+        record('Dr. Ann Poe', 'Lakeview Dental', '1 Lakeshore Rd', 'Mississauga ON L5G 1A1'),
+    ])
+    assert index.load(path) == 3
+    # Unchanged files aren't loaded again
+    assert index.load(path) == 0
+
+    assert {row['Name'] for row in index.query(city='bram')} == {'Dr. Jane Doe', 'Dr. John Roe'}
+    assert [row['Name'] for row in index.query(postal='l6x 1a0')] == ['Dr. Jane Doe']
+    # The sedation comes from the batch file name
+    assert len(index.query(sedation='oral mod')) == 3
+    assert index.query(sedation='deep') == []
+    assert [row['Name'] for row in index.query(business='queen st')] == ['Dr. John Roe']
+    assert [row['Name'] for row in index.query(text='lakeshore')] == ['Dr. Ann Poe']
+    assert [row['Name'] for row in index.query(city='brampton', text='main')] == ['Dr. Jane Doe']
+    assert index.query(limit=1)[0]['Source'] == os.path.abspath(path)
+
+def test_newest_file_wins(tmp_path, index):
+    older = write_csv(tmp_path / 'older.csv', [record('Dr. Jane Doe', 'Smile Dental', '12 Main Street', 'Brampton', Sedation='Deep')])
+    newer = write_csv(tmp_path / 'newer.csv', [record('Dr. Jane Doe', 'Smile Dental', '12 Main St.', 'Brampton ON L6X 1A0',
+                                                      Sedation='Deep')])
+    index.load(older)
+    index.load(newer)
+
+    rows = index.query(city='brampton')
+    assert [(row['Address'], row['Source']) for row in rows] == [('12 Main St.', os.path.abspath(newer))]
+    assert len(index.query(city='brampton', history=True)) == 2
+    assert 'Record index: 2 records from 2 files' in index.summary()
@@ -0,0 +1,66 @@
+import csv
+
+from records import (RecordBatch, dedupe, merge_files, normalize_address, normalize_name, normalize_postal_code,
+                     normalize_text, record_key)
+
+# Normalization, deduplication and merging of record batches
+
+
+def record(name='Dr. Jane Doe', business='Smile Dental', address='12 Main Street, Unit 4', city='Brampton, ON L6V 1A1', **extra):
+    return dict({'Name': name, 'Business Name': business, 'Address': address, 'City': city}, **extra)
+
+
+def test_normalizers():
+    assert normalize_text('  Smile \t Dental ') == 'smile dental'
+    assert normalize_name('Dr. Jane  DOE') == 'dr jane doe'
+    assert normalize_address('12 Main Street, Unit 4') == normalize_address('12 main st #4') == '12 main st #4'
+    assert normalize_address('5 Queen St. East, Suite 200') == '5 queen st e #200'
+    assert normalize_postal_code('Brampton, ON l6v1a1') == normalize_postal_code('BRAMPTON ON L6V 1A1') == 'L6V 1A1'
+    assert normalize_postal_code('Brampton, ON') == ''
+
+def test_dedupe_keeps_first_of_equivalent_records():
+    batch = RecordBatch.from_records([
+        record(),
+        record(name='DR JANE DOE', address='12 Main St. #4', city='Brampton ON L6V1A1'),
+        record(address='14 Main Street'),
+        record(),
+    ])
+    unique, timings = dedupe(batch)
+    assert [row['Address'] for row in unique.records()] == ['12 Main Street, Unit 4', '14 Main Street']
+    assert set(timings) == {'normalize', 'hash', 'take'}
+
+def test_sedation_is_part_of_the_key():
+    oral = record(Sedation='Oral Moderate')
+    deep = record(Sedation='Deep')
+    assert record_key(oral) != record_key(deep)
+    assert record_key(record()) == record_key(oral)[:4]
+
+    unique, _ = dedupe(RecordBatch.from_records([oral, deep, dict(oral, Sedation='ORAL MODERATE')]))
+    assert [row['Sedation'] for row in unique.records()] == ['Oral Moderate', 'Deep']
+    # The column keys match the record keys
+    assert unique.keys() == [record_key(row) for row in unique.records()]
+
+def test_extend_pads_columns_both_ways():
+    batch = RecordBatch.from_records([record(Sedation='Deep'), record(address='14 Main Street', Sedation='Deep')])
+    batch.extend(RecordBatch.from_records([record(Latitude='43.7'), record(Latitude='43.8'), record(Latitude='43.9')]))
+
+    assert len(batch) == 5
+    assert {column: len(values) for column, values in batch.columns.items()} == dict.fromkeys(batch.columns, 5)
+    assert batch.columns['Sedation'] == ['Deep', 'Deep', '', '', '']
+    assert batch.columns['Latitude'] == ['', '', '43.7', '43.8', '43.9']
+    assert batch.records()[2]['Latitude'] == '43.7'
+
+def test_merge_keeps_every_input_column(tmp_path):
+    paths = []
+    for number, rows in enumerate([[record(Sedation='Deep'), record(Sedation='Oral Moderate')],
+                                   [record(Sedation='Deep', Latitude='43.7')]]):
+        path = str(tmp_path / f"in{number}.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[-1]))
+            writer.writeheader()
+            writer.writerows(rows)
+        paths.append(path)
+
+    unique, _ = merge_files(paths)
+    assert list(unique.columns) == ['Name', 'Business Name', 'Address', 'City', 'Sedation', 'Latitude']
+    assert [(row['Sedation'], row['Latitude']) for row in unique.records()] == [('Deep', ''), ('Oral Moderate', '')]
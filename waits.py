@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import defaultdict, deque
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from metrics import metrics
+
+# Adaptive waits for the Selenium backend. Each wait is tied to the DOM
+# change a step produces and polls until it happens, so the scraper only
+# waits as long as the page actually needs. Latencies are tracked per step
+# and the timeout adapts to what the site has been doing recently.
+
+POLL_FREQUENCY = 0.1
+MIN_TIMEOUT = 2
+MAX_TIMEOUT = 30
+SAMPLES = 50
+
+
+def document_ready(driver):
+    return driver.execute_script("return document.readyState;") == 'complete'
+
+def element_present(selector):
+    return EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+
+def element_visible(selector):
+    return EC.visibility_of_element_located((By.CSS_SELECTOR, selector))
+
+
+class AdaptiveWait:
+    def __init__(self, default_timeout=10, factor=3):
+        self.default_timeout = default_timeout
+        self.factor = factor
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(lambda: deque(maxlen=SAMPLES))
+        self.timeouts = defaultdict(int)
+
+    def timeout(self, step):
+        # A few times the slowest recent latency, within fixed bounds
+        with self.lock:
+            samples = self.latencies[step]
+            if len(samples) < 5:
+                return self.default_timeout
+            return min(max(max(samples) * self.factor, MIN_TIMEOUT), MAX_TIMEOUT)
+
+    def record(self, step, elapsed):
+        with self.lock:
+            self.latencies[step].append(elapsed)
+
+    def until(self, driver, step, condition):
+        timeout = self.timeout(step)
+        start = time.perf_counter()
+        try:
+            with metrics.span('wait', step=step):
+                result = WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+        except Exception:
+            metrics.incr('errors', stage='wait')
+            with self.lock:
+                self.timeouts[step] += 1
+            # Count a timeout as a slow sample so the next wait allows longer
+            self.record(step, timeout)
+            raise
+        self.record(step, time.perf_counter() - start)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                step: {
+                    'samples': len(samples),
+                    'mean': sum(samples) / len(samples),
+                    'max': max(samples),
+                    'timeouts': self.timeouts[step],
+                }
+                for step, samples in self.latencies.items() if samples
+            }
+
+
+# Shared by every Selenium backend so the latencies learned carry across workers and runs
+adaptive_wait = AdaptiveWait()